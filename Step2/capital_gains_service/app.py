@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 import requests
 from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 app = Flask(__name__)
@@ -13,8 +14,40 @@ client = MongoClient(MONGO_URI)
 
 # Define the database and collection
 db = client['stocks_db']  # Database name
-stocks_collection = db['stocks1']
 
+# One collection per named portfolio, e.g. PORTFOLIOS=stocks1,stocks2,stocks3
+PORTFOLIOS = [name.strip() for name in os.getenv('PORTFOLIOS', 'stocks1,stocks2').split(',') if name.strip()]
+portfolio_collections = {name: db[name] for name in PORTFOLIOS}
+
+# Shared by the collection reads and the price lookups of a request
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('MAX_WORKERS', '8')))
+
+# A hung API call would otherwise hold a worker, and the whole request, forever
+PRICE_API_TIMEOUT = (float(os.getenv('PRICE_API_CONNECT_TIMEOUT', '3.05')),
+                     float(os.getenv('PRICE_API_READ_TIMEOUT', '5')))
+
+
+def fetch_ticker_price(symbol):
+    """Return the current price of symbol, or None if the API has no usable price for it."""
+    # One failed ticker leaves that symbol out instead of failing the whole response
+    try:
+        response = requests.get(f"{BASE_URL}?ticker={symbol}", headers={"X-Api-Key": API_KEY},
+                                timeout=PRICE_API_TIMEOUT)
+        if response.status_code != 200:
+            print(f"Failed to fetch ticker for {symbol}, API response: {response.status_code}")
+            return None
+        api_response = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Failed to fetch ticker for {symbol}: {str(e)}")
+        return None
+
+    # Handle API response formats
+    if isinstance(api_response, list) and len(api_response) > 0:
+        return api_response[0].get('price', 0.0)
+    if isinstance(api_response, dict):
+        return api_response.get('price', 0.0)
+    print(f"Unexpected API response format: {api_response}")
+    return None
 
 
 @app.route('/capital-gains', methods=['GET'])
@@ -25,65 +58,52 @@ def calculate_capital_gains():
         numsharesgt = request.args.get('numsharesgt', type=int)
         numshareslt = request.args.get('numshareslt', type=int)
 
-        # Fetch stocks from the appropriate collection(s)
-        if portfolio == "stocks1":
-            stocks = list(stocks1_collection.find())
-        elif portfolio == "stocks2":
-            stocks = list(stocks2_collection.find())
-        else:
-            stocks = list(stocks1_collection.find()) + list(stocks2_collection.find())
-
-        print("Initial stocks:", stocks)
+        # portfolio=stocks1 or portfolio=stocks1,stocks3; every portfolio when absent
+        names = [name.strip() for name in portfolio.split(',')] if portfolio else PORTFOLIOS
+        unknown = [name for name in names if name not in portfolio_collections]
+        if unknown:
+            return jsonify({"error": f"Unknown portfolio: {', '.join(unknown)}"}), 400
 
-        # Apply filters
+        # Apply filters in the query
+        query = {}
         if numsharesgt is not None:
-            stocks = [stock for stock in stocks if stock.get('shares', 0) > numsharesgt]
+            query.setdefault('shares', {})['$gt'] = numsharesgt
         if numshareslt is not None:
-            stocks = [stock for stock in stocks if stock.get('shares', 0) < numshareslt]
+            query.setdefault('shares', {})['$lt'] = numshareslt
 
-        print("Stocks after fetching from database:", stocks)
-        for stock in stocks:
-            print("Stock type:", type(stock))  # Should always be <class 'dict'>
+        # Read every portfolio at once instead of one after the other
+        reads = {name: executor.submit(lambda name: list(portfolio_collections[name].find(query)), name)
+                 for name in names}
+        stocks_by_portfolio = {name: future.result() for name, future in reads.items()}
+        print("Stocks after fetching from database:", stocks_by_portfolio)
 
-        if not stocks:
-            return jsonify({"total_capital_gains": 0.0}), 200
+        # Price each symbol once, however many portfolios hold it
+        symbols = {stock.get('symbol', '').upper()
+                   for stocks in stocks_by_portfolio.values() for stock in stocks}
+        prices = dict(zip(symbols, executor.map(fetch_ticker_price, symbols)))
 
-        # Calculate total capital gains
+        # Calculate capital gains per portfolio and in total
+        portfolio_gains = {}
         total_capital_gains = 0.0
-        for stock in stocks:
-            symbol = stock.get('symbol', '').upper()
-            purchase_price = stock.get('purchase price', 0.0)
-            shares = stock.get('shares', 0)
-
-            # Fetch current ticker price from the external API
-            # response = requests.get(f"{BASE_URL}?ticker={symbol}", headers={"X-Api-Key": API_KEY})
-            # if response.status_code == 200:
-            #     ticker_price = response.json().get('price', 0.0)
-            #     capital_gain = (ticker_price - purchase_price) * shares
-            #     total_capital_gains += capital_gain
-            #     print(f"Stock: {symbol}, Ticker: {ticker_price}, Gain: {capital_gain}")
-            # else:
-            #     print(f"Failed to fetch ticker for {symbol}, API response: {response.status_code}")
-            response = requests.get(f"{BASE_URL}?ticker={symbol}", headers={"X-Api-Key": API_KEY})
-            if response.status_code == 200:
-                api_response = response.json()
-
-                # Handle API response formats
-                if isinstance(api_response, list) and len(api_response) > 0:
-                    ticker_price = api_response[0].get('price', 0.0)
-                elif isinstance(api_response, dict):
-                    ticker_price = api_response.get('price', 0.0)
-                else:
-                    print(f"Unexpected API response format: {api_response}")
+        for name, stocks in stocks_by_portfolio.items():
+            gains = 0.0
+            for stock in stocks:
+                symbol = stock.get('symbol', '').upper()
+                purchase_price = stock.get('purchase price', 0.0)
+                shares = stock.get('shares', 0)
+
+                ticker_price = prices[symbol]
+                if ticker_price is None:
                     continue  # Skip this stock
 
                 capital_gain = (ticker_price - purchase_price) * shares
-                total_capital_gains += capital_gain
-                print(f"Stock: {symbol}, Ticker: {ticker_price}, Gain: {capital_gain}")
-            else:
-                print(f"Failed to fetch ticker for {symbol}, API response: {response.status_code}")
+                gains += capital_gain
+                print(f"Portfolio: {name}, Stock: {symbol}, Ticker: {ticker_price}, Gain: {capital_gain}")
+            portfolio_gains[name] = round(gains, 2)
+            total_capital_gains += gains
 
-        return jsonify({"total_capital_gains": round(total_capital_gains, 2)}), 200
+        return jsonify({"total_capital_gains": round(total_capital_gains, 2),
+                        "portfolios": portfolio_gains}), 200
     except Exception as e:
         print("Error occurred:", str(e))
         return jsonify({"error": "An internal error occurred", "details": str(e)}), 500
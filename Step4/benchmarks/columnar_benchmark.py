@@ -0,0 +1,86 @@
+"""Compare the per-holding gains loop with the NumPy columnar path, in process.
+
+No services are needed; holdings and prices are generated:
+    python benchmarks/columnar_benchmark.py --sizes 10000 100000 1000000
+
+"build" turns stock documents into arrays sorted by shares; "build+compute"
+is what a request pays when it builds the arrays itself, and turns out slower
+than the loop, which is why no endpoint does that. "snapshot" is the compute
+alone, filtering with binary searches over arrays already sorted by shares:
+the snapshot engine pays the build only when holdings change, so its speedup
+only holds for repeated queries against unchanged holdings. The loop is the
+one in calculate_capital_gains without its per-holding log lines, so the real
+endpoint is slower still.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from shared.columnar import Holdings  # noqa: E402
+
+
+def generate(count, symbols, seed):
+    rng = random.Random(seed)
+    universe = [f"S{i:04d}" for i in range(symbols)]
+    stocks = [{'symbol': rng.choice(universe), 'shares': rng.randint(1, 500),
+               'purchase price': round(rng.uniform(10, 500), 2)} for _ in range(count)]
+    # Leave a few symbols unpriced, like unknown tickers
+    prices = {symbol: round(rng.uniform(10, 500), 2) for symbol in universe[:-3]}
+    prices.update({symbol: None for symbol in universe[-3:]})
+    return stocks, prices
+
+
+def loop_gains(stocks, prices, numsharesgt=None, numshareslt=None):
+    total = 0.0
+    for stock in stocks:
+        shares = stock.get('shares', 0)
+        if numsharesgt is not None and not shares > numsharesgt:
+            continue
+        if numshareslt is not None and not shares < numshareslt:
+            continue
+        ticker_price = prices[stock.get('symbol', '').upper()]
+        if ticker_price is None or isinstance(ticker_price, Exception):
+            continue
+        total += ticker_price * shares - stock.get('purchase price', 0.0) * shares
+    return total
+
+
+def best_of(repeat, fn, *args):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'holdings':>10} {'loop':>10} {'build':>10} {'build+compute':>14} {'speedup':>8} "
+          f"{'snapshot':>10} {'speedup':>8}")
+    for size in args.sizes:
+        stocks, prices = generate(size, args.symbols, args.seed)
+        loop_time, expected = best_of(args.repeat, loop_gains, stocks, prices, 50, 400)
+        build_time, holdings = best_of(args.repeat, lambda: Holdings.from_stocks(stocks).sorted_by_shares())
+        snapshot_time, (total, _) = best_of(args.repeat,
+                                            lambda: holdings.filter_sorted(50, 400).capital_gains(prices))
+        assert abs(total - expected) <= 1e-6 * max(1.0, abs(expected)), (total, expected)
+        per_request_time = build_time + snapshot_time
+        print(f"{size:>10} {loop_time * 1000:>8.1f}ms {build_time * 1000:>8.1f}ms "
+              f"{per_request_time * 1000:>12.1f}ms {loop_time / per_request_time:>7.2f}x "
+              f"{snapshot_time * 1000:>8.1f}ms {loop_time / snapshot_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
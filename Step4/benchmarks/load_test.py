@@ -0,0 +1,95 @@
+"""Closed-loop load generator for the valuation endpoints.
+
+Run the stack against the mock provider first so results are reproducible:
+    PRICE_PROVIDER=mock docker compose --profile mock up -d
+    python benchmarks/load_test.py --holdings 50 --clients 8 --requests 200
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+import requests
+
+STOCKS_URL = "http://localhost:5001"
+CAPITAL_GAINS_URL = "http://localhost:5003"
+
+
+def seed_holdings(count, seed):
+    rng = random.Random(seed)
+    ids = []
+    for i in range(count):
+        stock = {
+            "name": f"Load test {i}",
+            "symbol": f"LT{i:04d}",
+            "purchase price": round(rng.uniform(10, 500), 2),
+            "purchase date": "01-01-2024",
+            "shares": rng.randint(1, 200),
+        }
+        response = requests.post(f"{STOCKS_URL}/stocks", json=stock)
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+def run(url, clients, total_requests):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = [total_requests]
+
+    def worker():
+        nonlocal errors
+        session = requests.Session()
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            response = session.get(url)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{url}")
+    print(f"  requests={len(latencies)} errors={errors} throughput={len(latencies) / wall:.1f} req/s")
+    print(f"  p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms "
+          f"max={latencies[-1] * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holdings", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--engine", choices=["python", "aggregate", "snapshot"], default="python",
+                        help="capital-gains engine to exercise")
+    parser.add_argument("--keep", action="store_true", help="leave the seeded holdings in the database")
+    args = parser.parse_args()
+
+    ids = seed_holdings(args.holdings, args.seed)
+    try:
+        run(f"{STOCKS_URL}/stocks/portfolio-value", args.clients, args.requests)
+        run(f"{CAPITAL_GAINS_URL}/capital-gains?engine={args.engine}", args.clients, args.requests)
+    finally:
+        if not args.keep:
+            for stock_id in ids:
+                requests.delete(f"{STOCKS_URL}/stocks/{stock_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 from flask import Flask, request, jsonify
-import requests
-from pymongo import MongoClient
+from pymongo import ASCENDING
 import os
 import logging
+from datetime import timedelta
+from shared.holdings_snapshot import VERSIONS_COLLECTION, HoldingsSnapshot, read_version
+from shared.mongo import LazyMongo
+from shared.portfolio_aggregates import USE_PORTFOLIO_AGGREGATES, read_positions
+from shared.health import health_blueprint
+from shared.price_store import price_source_from_env, save_quotes, utcnow
+from shared.result_cache import ResultCache
 
 # Ensure logs directory exists
 os.makedirs("logs", exist_ok=True)
@@ -32,21 +38,165 @@ logger.addHandler(console_handler)
 logger.info("Logging setup complete. Capital Gains service is running.")
 
 app = Flask(__name__)
-API_KEY = 'RMRgIp4laaBoVSyyoEg3oQ==kpRILqdNoYvzkjzX'
 STOCKS_URL = "http://localhost:5001/stocks"
-BASE_URL = 'https://api.api-ninjas.com/v1/stockprice'
-MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
 
-logger.info(f"Starting capital gains service with MONGO_URI: {MONGO_URI}")
-try:
-    client = MongoClient(MONGO_URI)
-    # Define the database and collection
-    db = client['stocks_db']  # Database name
-    stocks_collection = db['stocks']
-    logger.info("Successfully connected to MongoDB")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {str(e)}")
-    raise
+# Connects on first use; /readyz reports whether MongoDB is reachable
+mongo = LazyMongo.from_env()
+logger.info(f"Starting capital gains service with MONGO_URI: {mongo.uri}")
+stocks_collection = mongo.collection('stocks')
+# Gains are read-only, so they follow MONGO_READ_PREFERENCE and may be served by a secondary
+stocks_reads = mongo.read_collection('stocks')
+prices_collection = mongo.collection('prices')
+aggregates_collection = mongo.collection('portfolio_aggregates')
+
+# Only the fields the gains calculation needs
+HOLDING_PROJECTION = {'_id': 0, 'symbol': 1, 'shares': 1, 'purchase price': 1}
+
+
+@mongo.after_connect
+def ensure_holding_indexes():
+    stocks_collection.create_index([('shares', ASCENDING)], name='shares')
+
+# python: price and sum holdings here; aggregate: let Mongo join against the prices collection;
+# snapshot: NumPy over an in-memory columnar copy of the holdings, reloaded only when they change
+CAPITAL_GAINS_ENGINES = ('python', 'aggregate', 'snapshot')
+CAPITAL_GAINS_ENGINE = os.getenv('CAPITAL_GAINS_ENGINE', 'python')
+PRICE_STORE_MAX_STALENESS = float(os.getenv('PRICE_STORE_MAX_STALENESS', '120'))
+
+price_client, price_source = price_source_from_env(mongo)
+
+versions_collection = mongo.collection(VERSIONS_COLLECTION)
+holdings_snapshot = HoldingsSnapshot(stocks_collection, versions_collection)
+
+# Computed responses, reused until holdings or prices change
+result_cache = ResultCache.from_env('capital-gains')
+
+
+def _gains_pipeline(query, fresh_after):
+    return [
+        {'$match': query},
+        {'$project': {'_id': 0, 'ticker': {'$toUpper': '$symbol'}, 'shares': 1, 'purchase price': 1}},
+        {'$lookup': {'from': 'prices', 'localField': 'ticker', 'foreignField': 'symbol', 'as': 'quote'}},
+        {'$facet': {
+            # Holdings without a fresh quote, so we can fetch those and retry
+            'missing': [
+                {'$match': {'$or': [{'quote.0': {'$exists': False}}, {'quote.fetched_at': {'$lt': fresh_after}}]}},
+                {'$group': {'_id': '$ticker'}},
+            ],
+            # Stale quotes still count if a live top-up fails
+            'by_symbol': [
+                {'$unwind': '$quote'},
+                {'$match': {'quote.price': {'$ne': None}}},
+                {'$group': {
+                    '_id': '$ticker',
+                    'shares': {'$sum': '$shares'},
+                    'capital_gains': {'$sum': {'$multiply': [
+                        {'$subtract': ['$quote.price', '$purchase price']}, '$shares']}},
+                }},
+                {'$sort': {'_id': 1}},
+            ],
+        }},
+    ]
+
+
+def capital_gains_aggregate(query):
+    """Compute gains inside Mongo with $lookup into the prices collection."""
+    for attempt in range(2):
+        fresh_after = utcnow() - timedelta(seconds=PRICE_STORE_MAX_STALENESS)
+        result = next(stocks_reads.aggregate(_gains_pipeline(query, fresh_after)))
+        missing = [row['_id'] for row in result['missing']]
+        if not missing or attempt == 1:
+            break
+        # Top up the prices collection and run the pipeline once more
+        logger.info(f"No fresh quote for {missing}, fetching before re-running the pipeline")
+        quotes = price_client.get_prices(missing)
+        save_quotes(prices_collection, {symbol: price for symbol, price in quotes.items()
+                                        if not isinstance(price, Exception)})
+
+    if missing:
+        logger.warning(f"Capital gains use stale or no quotes for: {missing}")
+    by_symbol = [{'symbol': row['_id'], 'shares': row['shares'], 'capital_gains': round(row['capital_gains'], 2)}
+                 for row in result['by_symbol']]
+    total = sum(row['capital_gains'] for row in result['by_symbol'])
+    logger.info(f"Total capital gains calculated by aggregation: {total}")
+    return {'total_capital_gains': round(total, 2), 'by_symbol': by_symbol, 'missing_quotes': missing}, not missing
+
+
+def capital_gains_columnar(holdings):
+    """Vectorized gains over columnar holdings, with the same per-symbol breakdown as the aggregate engine."""
+    if not len(holdings):
+        logger.info("No stocks match the filtering criteria")
+        return {'total_capital_gains': 0.0, 'by_symbol': []}, True
+    prices = price_source.get_prices(holdings.held_symbols())
+    for symbol, price in prices.items():
+        if isinstance(price, Exception):
+            logger.error(f"Failed to fetch ticker for {symbol}: {str(price)}")
+        elif price is None:
+            logger.warning(f"Unknown ticker {symbol}, skipping")
+    total, by_symbol = holdings.capital_gains(prices)
+    logger.info(f"Total capital gains calculated over {len(holdings)} holdings: {total}")
+    complete = not any(isinstance(price, Exception) for price in prices.values())
+    return {'total_capital_gains': round(total, 2), 'by_symbol': by_symbol}, complete
+
+
+def capital_gains(engine, query, numsharesgt=None, numshareslt=None, holdings_version=None):
+    """Compute the capital gains response body with the given engine.
+
+    Returns ``(body, complete)``; ``complete`` is False when some holdings were left out
+    because their price lookup failed, so the body shouldn't be cached.
+    """
+    if engine == 'aggregate':
+        return capital_gains_aggregate(query)
+
+    if engine == 'snapshot':
+        holdings = holdings_snapshot.holdings(numsharesgt, numshareslt, version=holdings_version)
+        logger.info(f"Found {len(holdings)} stocks in snapshot version {holdings_snapshot.version}")
+        return capital_gains_columnar(holdings)
+
+    # Unfiltered requests can use the change-stream aggregate: one row per symbol with its cost basis
+    aggregate = read_positions(aggregates_collection) if USE_PORTFOLIO_AGGREGATES and not query else None
+    if aggregate is not None:
+        positions, _ = aggregate
+        stocks = [{'symbol': symbol, 'shares': position['shares'], 'cost basis': position['cost_basis']}
+                  for symbol, position in positions.items()]
+        logger.info(f"Read {len(stocks)} positions from the portfolio aggregate")
+    else:
+        stocks = list(stocks_reads.find(query, HOLDING_PROJECTION))
+        logger.info(f"Found {len(stocks)} stocks matching {query}")
+
+    if not stocks:
+        logger.info("No stocks match the filtering criteria")
+        return {"total_capital_gains": 0.0}, True
+
+    # Price every distinct symbol concurrently before aggregating
+    prices = price_source.get_prices([stock.get('symbol', '') for stock in stocks])
+
+    # Calculate total capital gains
+    total_capital_gains = 0.0
+    complete = True
+    for stock in stocks:
+        symbol = stock.get('symbol', '').upper()
+        purchase_price = stock.get('purchase price', 0.0)
+        shares = stock.get('shares', 0)
+
+        logger.info(f"Processing stock: {symbol}, shares: {shares}, purchase price: {purchase_price}")
+
+        ticker_price = prices[symbol]
+        if isinstance(ticker_price, Exception):
+            logger.error(f"Failed to fetch ticker for {symbol}: {str(ticker_price)}")
+            complete = False
+            continue
+        if ticker_price is None:
+            logger.warning(f"Unknown ticker {symbol}, skipping")
+            continue  # Skip this stock
+
+        cost_basis = stock.get('cost basis', purchase_price * shares)
+        capital_gain = ticker_price * shares - cost_basis
+        total_capital_gains += capital_gain
+        logger.info(f"Stock: {symbol}, Current price: {ticker_price}, Capital gain: {capital_gain}")
+
+    logger.info(f"Total capital gains calculated: {total_capital_gains}")
+    return {"total_capital_gains": round(total_capital_gains, 2)}, complete
 
 
 @app.route('/capital-gains', methods=['GET'])
@@ -60,56 +210,44 @@ def calculate_capital_gains():
 
         logger.info(f"Query parameters - portfolio: {portfolio}, numsharesgt: {numsharesgt}, numshareslt: {numshareslt}")
 
-        # Fetch stocks from the appropriate collection(s)
-        stocks = list(stocks_collection.find({}))
-        logger.info(f"Found {len(stocks)} stocks in database")
-
-        # Apply filters
+        # Let Mongo apply the share filters through the shares index
+        query = {}
         if numsharesgt is not None:
-            stocks = [stock for stock in stocks if stock.get('shares', 0) > numsharesgt]
-            logger.info(f"After applying numsharesgt filter: {len(stocks)} stocks remaining")
+            query.setdefault('shares', {})['$gt'] = numsharesgt
         if numshareslt is not None:
-            stocks = [stock for stock in stocks if stock.get('shares', 0) < numshareslt]
-            logger.info(f"After applying numshareslt filter: {len(stocks)} stocks remaining")
-
-
-        if not stocks:
-            logger.info("No stocks match the filtering criteria")
-            return jsonify({"total_capital_gains": 0.0}), 200
-
-        # Calculate total capital gains
-        total_capital_gains = 0.0
-        for stock in stocks:
-            symbol = stock.get('symbol', '').upper()
-            purchase_price = stock.get('purchase price', 0.0)
-            shares = stock.get('shares', 0)
-
-            logger.info(f"Processing stock: {symbol}, shares: {shares}, purchase price: {purchase_price}")
-
-            try:
-                response = requests.get(f"{BASE_URL}?ticker={symbol}", headers={"X-Api-Key": API_KEY})
-                if response.status_code == 200:
-                    api_response = response.json()
-
-                    # Handle API response formats
-                    if isinstance(api_response, list) and len(api_response) > 0:
-                        ticker_price = api_response[0].get('price', 0.0)
-                    elif isinstance(api_response, dict):
-                        ticker_price = api_response.get('price', 0.0)
-                    else:
-                        print(f"Unexpected API response format: {api_response}")
-                        continue  # Skip this stock
-
-                    capital_gain = (ticker_price - purchase_price) * shares
-                    total_capital_gains += capital_gain
-                    logger.info(f"Stock: {symbol}, Current price: {ticker_price}, Capital gain: {capital_gain}")
-                else:
-                    logger.error(f"Failed to fetch ticker for {symbol}, API response: {response.status_code}")
-            except requests.RequestException as e:
-                logger.error(f"Request exception for {symbol}: {str(e)}")
-
-        logger.info(f"Total capital gains calculated: {total_capital_gains}")
-        return jsonify({"total_capital_gains": round(total_capital_gains, 2)}), 200
+            query.setdefault('shares', {})['$lt'] = numshareslt
+
+        engine = request.args.get('engine', CAPITAL_GAINS_ENGINE)
+        if engine not in CAPITAL_GAINS_ENGINES:
+            logger.warning(f"Unknown capital gains engine: {engine}")
+            return jsonify({"error": "Unknown engine. Expected 'python', 'aggregate' or 'snapshot'"}), 400
+
+        # The same filters over unchanged holdings and prices give the same answer
+        key = (engine, numsharesgt, numshareslt)
+        # Read every time rather than through the snapshot's throttled poll, so a hit never
+        # predates the last write
+        holdings_version = read_version(versions_collection)
+        if 'no-cache' in request.headers.get('Cache-Control', ''):
+            cache_status = 'bypass'
+        else:
+            result, cache_status = result_cache.get(key, (holdings_version, price_source.epoch))
+            if result is not None:
+                logger.info(f"Serving cached capital gains for {key}")
+                response = jsonify(result)
+                response.headers['Cache-Status'] = result_cache.header(cache_status)
+                return response, 200
+
+        result, complete = capital_gains(engine, query, numsharesgt, numshareslt, holdings_version)
+        if complete:
+            # The price epoch is read after computing: fetching the missing quotes moves it, and an
+            # entry tagged with the epoch from before would never hit. The holdings version stays
+            # the one read before, so a write landing meanwhile makes the entry stale.
+            result_cache.put(key, (holdings_version, price_source.epoch), result)
+        else:
+            logger.warning(f"Not caching capital gains for {key}: some price lookups failed")
+        response = jsonify(result)
+        response.headers['Cache-Status'] = result_cache.header(cache_status)
+        return response, 200
 
     except Exception as e:
         logger.error(f"Error calculating capital gains: {str(e)}")
@@ -119,6 +257,10 @@ def home():
     logger.info("Home endpoint accessed")
     return "Capital Gains Service API. Use /capital-gains endpoint to calculate capital gains."
 
+app.register_blueprint(health_blueprint(
+    mongo, lambda: dict(price_source.stats(), holdings_snapshot=holdings_snapshot.stats(),
+                        result_cache=result_cache.stats())))
+
 @app.route('/kill', methods=['GET'])
 def kill_container():
     logger.warning("Kill endpoint accessed - shutting down service")
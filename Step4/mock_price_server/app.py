@@ -0,0 +1,104 @@
+"""Local stand-in for the api-ninjas stockprice API, for load testing without the real upstream.
+
+Configured through env vars:
+  MOCK_PRICES            per-symbol prices, e.g. "NVDA=134.5,AAPL=221.1"
+  MOCK_UNLISTED          "hash" gives unlisted symbols a stable made-up price, "empty" answers [] like the real API
+  MOCK_LATENCY           latency distribution: fixed | uniform | normal | lognormal
+  MOCK_LATENCY_MS        mean latency in milliseconds
+  MOCK_LATENCY_JITTER_MS spread (uniform half-width / normal stddev / lognormal sigma * mean)
+  MOCK_ERROR_RATE        fraction of requests answered with MOCK_ERROR_STATUS
+  MOCK_SEED              seed for the latency and error generator
+"""
+import os
+import math
+import random
+import threading
+import time
+import zlib
+import logging
+from datetime import datetime, timezone
+from flask import Flask, request, jsonify
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def _parse_prices(raw):
+    prices = {}
+    for item in raw.split(','):
+        if '=' in item:
+            symbol, price = item.split('=', 1)
+            prices[symbol.strip().upper()] = float(price)
+    return prices
+
+
+PRICES = _parse_prices(os.getenv('MOCK_PRICES', 'NVDA=134.7,AAPL=221.3,GOOG=165.2,AMZN=186.4,MSFT=418.9'))
+UNLISTED = os.getenv('MOCK_UNLISTED', 'hash')
+LATENCY = os.getenv('MOCK_LATENCY', 'fixed')
+LATENCY_MS = float(os.getenv('MOCK_LATENCY_MS', '50'))
+LATENCY_JITTER_MS = float(os.getenv('MOCK_LATENCY_JITTER_MS', '10'))
+ERROR_RATE = float(os.getenv('MOCK_ERROR_RATE', '0'))
+ERROR_STATUS = int(os.getenv('MOCK_ERROR_STATUS', '502'))
+
+_rng = random.Random(int(os.getenv('MOCK_SEED', '42')))
+_rng_lock = threading.Lock()
+
+app = Flask(__name__)
+
+
+def _latency_seconds():
+    with _rng_lock:
+        if LATENCY == 'uniform':
+            ms = _rng.uniform(LATENCY_MS - LATENCY_JITTER_MS, LATENCY_MS + LATENCY_JITTER_MS)
+        elif LATENCY == 'normal':
+            ms = _rng.gauss(LATENCY_MS, LATENCY_JITTER_MS)
+        elif LATENCY == 'lognormal':
+            # Long right tail, median at LATENCY_MS
+            sigma = LATENCY_JITTER_MS / LATENCY_MS if LATENCY_MS else 0.0
+            ms = LATENCY_MS * math.exp(_rng.gauss(0, sigma))
+        else:
+            ms = LATENCY_MS
+    return max(ms, 0.0) / 1000
+
+
+def _should_fail():
+    with _rng_lock:
+        return _rng.random() < ERROR_RATE
+
+
+def _price_for(symbol):
+    if symbol in PRICES:
+        return PRICES[symbol]
+    if UNLISTED == 'hash':
+        # Stable across runs and processes, unlike hash()
+        return round(10 + zlib.crc32(symbol.encode()) % 49000 / 100, 2)
+    return None
+
+
+@app.route('/v1/stockprice', methods=['GET'])
+def stock_price():
+    time.sleep(_latency_seconds())
+    if _should_fail():
+        return jsonify({'error': 'Injected failure'}), ERROR_STATUS
+
+    symbol = request.args.get('ticker', '').upper()
+    price = _price_for(symbol)
+    if price is None:
+        return jsonify([]), 200
+    return jsonify({
+        'ticker': symbol,
+        'name': symbol,
+        'price': price,
+        'exchange': 'MOCK',
+        'updated': int(datetime.now(timezone.utc).timestamp()),
+        'currency': 'USD',
+    }), 200
+
+
+@app.route('/', methods=['GET'])
+def home():
+    return "Mock stock price API. Use /v1/stockprice?ticker=<symbol>."
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=8090, threaded=True)
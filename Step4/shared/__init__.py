@@ -0,0 +1 @@
+"""Code shared by the stocks and capital-gains services."""
@@ -0,0 +1,99 @@
+"""Share one periodically recomputed value among many streaming subscribers.
+
+A single background thread calls ``compute()`` every ``interval`` seconds
+while anyone is subscribed, and pushes the result to every subscriber only
+when it differs from the last one. Subscribers get the latest value on
+subscribe; a slow subscriber just skips to the newest value instead of
+queueing old ones. The thread exits when the last subscriber leaves.
+"""
+import json
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    def __init__(self, name, compute, interval=2.0):
+        self.name = name
+        self.compute = compute
+        self.interval = interval
+        self._subscribers = set()
+        self._latest = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.computations = 0
+        self.published = 0
+
+    def subscribe(self):
+        """Return a queue that receives every new value, starting with the current one."""
+        subscriber = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._latest is not None:
+                subscriber.put(self._latest)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-broadcaster', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _publish(self, value):
+        with self._lock:
+            self._latest = value
+            self.published += 1
+            for subscriber in self._subscribers:
+                # Replace whatever the subscriber hasn't read yet
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(value)
+
+    def _run(self):
+        logger.info(f"Starting {self.name} broadcaster")
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Forget the last value so a new subscriber doesn't see a stale one
+                    self._thread = None
+                    self._latest = None
+                    logger.info(f"No {self.name} subscribers left, stopping broadcaster")
+                    return
+            try:
+                value = self.compute()
+                self.computations += 1
+                if value != self._latest:
+                    self._publish(value)
+            except Exception as e:
+                logger.error(f"Failed to compute {self.name}: {str(e)}")
+            time.sleep(self.interval)
+
+    def stream(self, heartbeat=15.0):
+        """Yield Server-Sent Events for a new subscriber, with comment lines as keep-alives."""
+        subscriber = self.subscribe()
+        try:
+            while True:
+                try:
+                    value = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Also how we notice a client that went away
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: {self.name}\ndata: {json.dumps(value)}\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'running': self._thread is not None,
+                'computations': self.computations,
+                'published': self.published,
+            }
@@ -0,0 +1,85 @@
+"""Minimal circuit breaker for calls to the upstream price provider."""
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and fails fast for ``reset_timeout`` seconds.
+
+    Once the timeout elapses a single trial call is let through (half-open);
+    its outcome closes the circuit again or re-opens it. Exceptions listed in
+    ``ignore`` say nothing about the upstream's health and leave the state alone.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, is_failure=None, ignore=()):
+        self.name = name
+        self.ignore = ignore
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure or (lambda e: True)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit '{self.name}' is open")
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f"Circuit '{self.name}' is half-open, trial call in progress")
+                self._trial_in_flight = True
+
+        try:
+            result = fn(*args)
+        except self.ignore:
+            with self._lock:
+                self._trial_in_flight = False
+            raise
+        except Exception as e:
+            self._record(failed=self.is_failure(e))
+            raise
+        self._record(failed=False)
+        return result
+
+    def _record(self, failed):
+        with self._lock:
+            self._trial_in_flight = False
+            if not failed:
+                if self.state != CLOSED:
+                    logger.info(f"Circuit '{self.name}' closed")
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'rejected_calls': self.rejected,
+            }
@@ -0,0 +1,95 @@
+"""Columnar holdings, the in-memory form of ``shared.holdings_snapshot``.
+
+Holdings are kept as parallel NumPy arrays (shares, cost basis and an index
+into a list of distinct symbols), sorted by shares, so a share filter is two
+binary searches and gains, market value and per-symbol breakdowns are a
+handful of array operations. Building the arrays costs more than one pass
+over the stock documents, so this only pays off because the snapshot keeps
+them across requests. Prices come in as the dict returned by
+``get_prices``; unknown tickers (None) and failed lookups (exceptions) are
+priced as NaN and left out, as the loops in the services do.
+"""
+import numpy as np
+
+
+def _number(value):
+    # Share counts are whole numbers; keep them ints in JSON
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class Holdings:
+    def __init__(self, symbols, symbol_index, shares, cost_basis):
+        self.symbols = symbols
+        self.symbol_index = symbol_index
+        self.shares = shares
+        self.cost_basis = cost_basis
+
+    @classmethod
+    def from_stocks(cls, stocks):
+        """Build from stock documents."""
+        positions = {}
+        symbols = []
+        symbol_index = []
+        shares = []
+        cost_basis = []
+        for stock in stocks:
+            symbol = stock.get('symbol', '').upper()
+            index = positions.get(symbol)
+            if index is None:
+                index = positions[symbol] = len(symbols)
+                symbols.append(symbol)
+            count = stock.get('shares', 0)
+            symbol_index.append(index)
+            shares.append(count)
+            cost_basis.append(stock.get('purchase price', 0.0) * count)
+        return cls(symbols, np.array(symbol_index, dtype=np.int32),
+                   np.array(shares, dtype=np.float64), np.array(cost_basis, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.shares)
+
+    def take(self, rows):
+        """Holdings for a boolean mask or index array; the symbol list is shared, not copied."""
+        return Holdings(self.symbols, self.symbol_index[rows], self.shares[rows], self.cost_basis[rows])
+
+    def sorted_by_shares(self):
+        return self.take(np.argsort(self.shares, kind='stable'))
+
+    def filter_sorted(self, numsharesgt=None, numshareslt=None):
+        """Holdings with ``numsharesgt < shares < numshareslt``; they must already be sorted by shares."""
+        start = np.searchsorted(self.shares, numsharesgt, side='right') if numsharesgt is not None else 0
+        end = np.searchsorted(self.shares, numshareslt, side='left') if numshareslt is not None else len(self)
+        return self.take(slice(start, end))
+
+    def held_symbols(self):
+        """Distinct symbols that at least one holding refers to."""
+        return [self.symbols[i] for i in np.unique(self.symbol_index)]
+
+    def price_vector(self, prices):
+        """Price per entry of ``symbols``, NaN where the price is unknown or its lookup failed."""
+        vector = np.full(len(self.symbols), np.nan)
+        for index, symbol in enumerate(self.symbols):
+            price = prices.get(symbol)
+            if price is not None and not isinstance(price, Exception):
+                vector[index] = price
+        return vector
+
+    def market_value(self, prices):
+        holding_prices = self.price_vector(prices)[self.symbol_index]
+        return float(np.nansum(holding_prices * self.shares))
+
+    def capital_gains(self, prices):
+        """Return ``(total, by_symbol)``; holdings without a price don't count."""
+        holding_prices = self.price_vector(prices)[self.symbol_index]
+        priced = ~np.isnan(holding_prices)
+        gains = np.where(priced, holding_prices * self.shares - self.cost_basis, 0.0)
+
+        count = len(self.symbols)
+        gains_by_symbol = np.bincount(self.symbol_index, weights=gains, minlength=count)
+        shares_by_symbol = np.bincount(self.symbol_index, weights=self.shares, minlength=count)
+        priced_by_symbol = np.bincount(self.symbol_index, weights=priced, minlength=count) > 0
+        by_symbol = [{'symbol': self.symbols[i], 'shares': _number(shares_by_symbol[i]),
+                      'capital_gains': round(float(gains_by_symbol[i]), 2)}
+                     for i in np.flatnonzero(priced_by_symbol)]
+        return float(gains.sum()), sorted(by_symbol, key=lambda row: row['symbol'])
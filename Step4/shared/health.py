@@ -0,0 +1,29 @@
+"""Liveness, readiness and metrics endpoints shared by the Flask services."""
+import logging
+from flask import Blueprint, jsonify
+
+logger = logging.getLogger(__name__)
+
+
+def health_blueprint(mongo, metrics):
+    """``/healthz``, ``/readyz`` (pings MongoDB) and ``/metrics``, which serves the dict ``metrics()`` returns."""
+    blueprint = Blueprint('health', __name__)
+
+    @blueprint.route('/healthz', methods=['GET'])
+    def liveness():
+        return jsonify({'status': 'alive'}), 200
+
+    @blueprint.route('/readyz', methods=['GET'])
+    def readiness():
+        try:
+            mongo.ping()
+            return jsonify({'status': 'ready'}), 200
+        except Exception as e:
+            logger.warning(f"Readiness check failed: {str(e)}")
+            return jsonify({'status': 'unavailable', 'details': str(e)}), 503
+
+    @blueprint.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return jsonify(metrics()), 200
+
+    return blueprint
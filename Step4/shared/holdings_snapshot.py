@@ -0,0 +1,82 @@
+"""In-process snapshot of holdings, reloaded only when the stocks collection changes.
+
+The stocks service bumps a counter in ``collection_versions`` after every
+write. Readers poll that counter at most every HOLDINGS_VERSION_POLL_INTERVAL
+seconds and reload the holdings when it moves, so repeated capital-gains
+queries with different share filters are answered from memory. Holdings
+are kept columnar and sorted by shares, see ``shared.columnar``.
+"""
+import os
+import time
+import logging
+import threading
+from shared.columnar import Holdings
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_COLLECTION = 'collection_versions'
+HOLDINGS_VERSION_POLL_INTERVAL = float(os.getenv('HOLDINGS_VERSION_POLL_INTERVAL', '1'))
+
+
+def bump_version(versions_collection, name='stocks'):
+    versions_collection.update_one({'_id': name}, {'$inc': {'version': 1}}, upsert=True)
+
+
+def read_version(versions_collection, name='stocks'):
+    doc = versions_collection.find_one({'_id': name})
+    return doc.get('version', 0) if doc else 0
+
+
+class HoldingsSnapshot:
+    def __init__(self, stocks_collection, versions_collection, poll_interval=HOLDINGS_VERSION_POLL_INTERVAL,
+                 name='stocks'):
+        # Both collections should be read from the primary: a snapshot loaded from a lagging
+        # secondary would be tagged with a version it doesn't reflect and never reload
+        self.stocks_collection = stocks_collection
+        self.versions_collection = versions_collection
+        self.poll_interval = poll_interval
+        self.name = name
+        self.version = None
+        self._polled_version = None
+        self._holdings = Holdings.from_stocks([])
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def _load(self, version):
+        stocks = self.stocks_collection.find({}, {'_id': 0, 'symbol': 1, 'shares': 1, 'purchase price': 1})
+        self._holdings = Holdings.from_stocks(stocks).sorted_by_shares()
+        self.version = version
+        self.loads += 1
+        logger.info(f"Loaded {len(self._holdings)} holdings into the snapshot at version {version}")
+
+    def poll_version(self):
+        """The holdings version, read from Mongo at most once per poll interval."""
+        with self._lock:
+            now = time.monotonic()
+            if self._polled_version is None or now - self._checked_at >= self.poll_interval:
+                self._polled_version = read_version(self.versions_collection, self.name)
+                self._checked_at = now
+            return self._polled_version
+
+    def refresh(self, version=None):
+        """Reload if the holdings changed; pass ``version`` when the caller has just read it."""
+        # The version is read before the holdings: a write landing during the load bumps it again
+        # and forces a reload
+        if version is None:
+            version = self.poll_version()
+        with self._lock:
+            if version != self.version:
+                self._load(version)
+            else:
+                self.hits += 1
+
+    def holdings(self, numsharesgt=None, numshareslt=None, version=None):
+        """Return columnar holdings with ``numsharesgt < shares < numshareslt``."""
+        self.refresh(version)
+        # A reload swaps in a new object, so the one we read stays consistent without the lock
+        return self._holdings.filter_sorted(numsharesgt, numshareslt)
+
+    def stats(self):
+        return {'version': self.version, 'holdings': len(self._holdings), 'loads': self.loads, 'hits': self.hits}
@@ -0,0 +1,137 @@
+"""Per-process, lazily created MongoClient.
+
+MongoClient is not fork-safe: its sockets and monitor threads must not be
+shared between a gunicorn master and its workers. Nothing here connects at
+import time, so the app can be preloaded; each worker creates its own client
+on first use (or after ``reset()`` from the post_fork hook).
+"""
+import os
+import threading
+import logging
+from pymongo import MongoClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+
+def _optional_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def read_preference_from_env():
+    """Read preference for read-only handlers, e.g. MONGO_READ_PREFERENCE=secondaryPreferred.
+
+    MONGO_MAX_STALENESS_SECONDS bounds how far behind a secondary may be
+    (MongoDB requires at least 90 seconds); -1 means no bound.
+    """
+    mode = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_READ_PREFERENCE '{mode}'")
+    if mode == 'primary':
+        return Primary()
+    return READ_PREFERENCES[mode](max_staleness=int(os.getenv('MONGO_MAX_STALENESS_SECONDS', '-1')))
+
+
+class LazyMongo:
+    def __init__(self, uri, db_name='stocks_db', read_preference=None, **client_options):
+        self.uri = uri
+        self.db_name = db_name
+        self.read_preference = read_preference or Primary()
+        self.client_options = client_options
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._connect_hooks = []
+
+    @classmethod
+    def from_env(cls, db_name='stocks_db'):
+        options = {
+            'maxPoolSize': int(os.getenv('MONGO_MAX_POOL_SIZE', '100')),
+            'minPoolSize': int(os.getenv('MONGO_MIN_POOL_SIZE', '0')),
+            'serverSelectionTimeoutMS': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+            'connectTimeoutMS': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+            'socketTimeoutMS': _optional_int('MONGO_SOCKET_TIMEOUT_MS'),
+            'waitQueueTimeoutMS': _optional_int('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+        }
+        return cls(os.getenv('MONGO_URI', 'mongodb://localhost:27017'), db_name,
+                   read_preference=read_preference_from_env(),
+                   **{key: value for key, value in options.items() if value is not None})
+
+    def after_connect(self, hook):
+        """Run ``hook()`` once per process after its client is created, e.g. to ensure indexes.
+
+        A hook that fails is logged and retried on the next access.
+        """
+        self._connect_hooks.append(hook)
+        return hook
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = MongoClient(self.uri, **self.client_options)
+                self._pid = os.getpid()
+                self._pending_hooks = list(self._connect_hooks)
+                logger.info(f"Created MongoDB client for process {self._pid}")
+            client = self._client
+            pending, self._pending_hooks = self._pending_hooks, []
+
+        failed = []
+        for hook in pending:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"MongoDB startup hook {hook.__name__} failed: {str(e)}")
+                failed.append(hook)
+        if failed:
+            with self._lock:
+                self._pending_hooks.extend(failed)
+        return client
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    def collection(self, name):
+        return LazyCollection(self, name)
+
+    def read_collection(self, name):
+        """The collection for read-only handlers, routed by the configured read preference.
+
+        Writes must keep going through ``collection()`` so they stay on the primary.
+        """
+        return LazyCollection(self, name, self.read_preference)
+
+    def reset(self):
+        """Forget the client inherited from a parent process without closing its sockets."""
+        with self._lock:
+            self._client = None
+            self._pid = None
+
+    def ping(self):
+        self.client.admin.command('ping')
+
+
+class LazyCollection:
+    """Stands in for a pymongo Collection, resolving it against the current process's client."""
+
+    def __init__(self, mongo, name, read_preference=None):
+        self._mongo = mongo
+        self.name = name
+        self.read_preference = read_preference
+
+    def __getattr__(self, attr):
+        collection = self._mongo.db[self.name]
+        if self.read_preference is not None:
+            collection = collection.with_options(read_preference=self.read_preference)
+        return getattr(collection, attr)
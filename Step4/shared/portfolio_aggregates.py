@@ -0,0 +1,232 @@
+"""Portfolio aggregates kept up to date from a change stream on ``stocks``.
+
+A single document in ``portfolio_aggregates`` holds the holding count, the
+total cost basis and, per symbol, shares / cost basis / holding count.
+The aggregator process applies every insert, update and delete as a delta
+($inc) together with the change stream resume token, so it can restart
+where it left off. Valuation endpoints then read one small document
+instead of scanning every holding:
+    python -m shared.portfolio_aggregates
+
+Deltas for updates and deletes need the document's pre-image, so the
+aggregator enables changeStreamPreAndPostImages on the collection. That
+requires MongoDB 6.0+ running as a replica set.
+"""
+import os
+import time
+import logging
+from datetime import timedelta
+from pymongo.errors import OperationFailure, PyMongoError
+from shared.mongo import LazyMongo
+from shared.price_store import utcnow
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_ID = 'stocks'
+USE_PORTFOLIO_AGGREGATES = os.getenv('USE_PORTFOLIO_AGGREGATES', 'false').lower() == 'true'
+# Readers ignore the aggregate if the aggregator hasn't checked in for this long
+AGGREGATES_MAX_LAG = float(os.getenv('PORTFOLIO_AGGREGATES_MAX_LAG', '30'))
+HEARTBEAT_INTERVAL = 5.0
+CHANGE_STREAM_HISTORY_LOST = 286
+VALUATION_FIELDS = ('symbol', 'shares', 'purchase price')
+
+
+def _key(symbol):
+    # Field names can't contain '.', which tickers like BRK.B do
+    return symbol.upper().replace('.', '\uff0e')
+
+
+def _symbol(key):
+    return key.replace('\uff0e', '.')
+
+
+def _number(value):
+    # PUT and PATCH store fields unvalidated; a holding with e.g. "5" shares counts as zero
+    # instead of stopping the aggregator on the same event after every restart
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def _numeric_field(name):
+    # _number for the rebuild pipeline, where $multiply would fail the same way
+    return {'$cond': [{'$isNumber': f'${name}'}, f'${name}', 0]}
+
+
+def _contribution(doc):
+    if not doc or not doc.get('symbol'):
+        return None
+    shares = _number(doc.get('shares', 0))
+    return _key(str(doc['symbol'])), shares, shares * _number(doc.get('purchase price', 0.0))
+
+
+def read_positions(aggregates_collection):
+    """Return ``(positions, total_cost_basis)`` from a live aggregate, or None if it can't be trusted.
+
+    ``positions`` maps symbol -> {'shares', 'cost_basis', 'holdings'} for
+    symbols that are currently held.
+    """
+    try:
+        doc = aggregates_collection.find_one({'_id': AGGREGATE_ID})
+    except PyMongoError as e:
+        logger.error(f"Could not read portfolio aggregate: {str(e)}")
+        return None
+    if not doc or doc.get('heartbeat_at') is None:
+        return None
+    if utcnow() - doc['heartbeat_at'] > timedelta(seconds=AGGREGATES_MAX_LAG):
+        logger.warning("Portfolio aggregate is lagging, falling back to a full scan")
+        return None
+    positions = {_symbol(key): position for key, position in doc.get('positions', {}).items()
+                 if position.get('holdings', 0) > 0}
+    return positions, doc.get('total_cost_basis', 0.0)
+
+
+class PortfolioAggregator:
+    def __init__(self, mongo, stocks_name='stocks', aggregates_name='portfolio_aggregates'):
+        self.mongo = mongo
+        self.stocks_name = stocks_name
+        self.stocks_collection = mongo.collection(stocks_name)
+        self.aggregates_collection = mongo.collection(aggregates_name)
+        self._last_heartbeat = 0.0
+
+    def enable_pre_images(self):
+        try:
+            self.mongo.db.command('collMod', self.stocks_name, changeStreamPreAndPostImages={'enabled': True})
+        except OperationFailure as e:
+            logger.error(f"Could not enable change stream pre-images, updates will trigger rebuilds: {str(e)}")
+
+    def rebuild(self, resume_token):
+        """Recompute the aggregate from scratch; returns the operation time the scan reflects."""
+        with self.mongo.client.start_session() as session:
+            rows = list(self.stocks_collection.aggregate([
+                {'$group': {
+                    '_id': {'$toUpper': '$symbol'},
+                    'shares': {'$sum': _numeric_field('shares')},
+                    'cost_basis': {'$sum': {'$multiply': [_numeric_field('shares'),
+                                                          _numeric_field('purchase price')]}},
+                    'holdings': {'$sum': 1},
+                }},
+            ], session=session))
+            scanned_at = session.operation_time
+
+        positions = {_key(row['_id']): {'shares': row['shares'], 'cost_basis': row['cost_basis'],
+                                        'holdings': row['holdings']}
+                     for row in rows if row['_id']}
+        now = utcnow()
+        self.aggregates_collection.replace_one({'_id': AGGREGATE_ID}, {
+            'holding_count': sum(row['holdings'] for row in rows),
+            'total_cost_basis': sum(row['cost_basis'] for row in rows),
+            'positions': positions,
+            'resume_token': resume_token,
+            'updated_at': now,
+            'heartbeat_at': now,
+        }, upsert=True)
+        logger.info(f"Rebuilt portfolio aggregate from {len(rows)} symbols")
+        return scanned_at
+
+    def apply(self, change):
+        """Apply one change event; returns False if it can't be applied incrementally."""
+        operation = change['operationType']
+        before = after = None
+        if operation == 'insert':
+            after = change['fullDocument']
+        elif operation == 'delete':
+            before = change.get('fullDocumentBeforeChange')
+            if before is None:
+                return False
+        elif operation in ('update', 'replace'):
+            changed = set(change.get('updateDescription', {}).get('updatedFields', {}))
+            changed |= set(change.get('updateDescription', {}).get('removedFields', []))
+            if operation == 'update' and not any(field.split('.')[0] in VALUATION_FIELDS for field in changed):
+                self._save_token(change['_id'])
+                return True
+            before, after = change.get('fullDocumentBeforeChange'), change.get('fullDocument')
+            if before is None or after is None:
+                return False
+        else:
+            # drop, rename, invalidate...
+            return False
+
+        increments = {}
+        for contribution, sign in ((_contribution(before), -1), (_contribution(after), 1)):
+            if contribution is None:
+                continue
+            key, shares, cost_basis = contribution
+            for field, value in ((f'positions.{key}.shares', shares),
+                                 (f'positions.{key}.cost_basis', cost_basis),
+                                 (f'positions.{key}.holdings', 1),
+                                 ('holding_count', 1),
+                                 ('total_cost_basis', cost_basis)):
+                increments[field] = increments.get(field, 0) + sign * value
+        if not increments:
+            self._save_token(change['_id'])
+            return True
+
+        now = utcnow()
+        self.aggregates_collection.update_one({'_id': AGGREGATE_ID}, {
+            '$inc': increments,
+            '$set': {'resume_token': change['_id'], 'updated_at': now, 'heartbeat_at': now},
+        })
+        return True
+
+    def _save_token(self, token):
+        self.aggregates_collection.update_one({'_id': AGGREGATE_ID},
+                                              {'$set': {'resume_token': token, 'heartbeat_at': utcnow()}})
+
+    def _heartbeat(self, token):
+        if time.monotonic() - self._last_heartbeat >= HEARTBEAT_INTERVAL:
+            self._save_token(token)
+            self._last_heartbeat = time.monotonic()
+
+    def _follow(self):
+        doc = self.aggregates_collection.find_one({'_id': AGGREGATE_ID}, {'resume_token': 1})
+        token = doc.get('resume_token') if doc else None
+        with self.stocks_collection.watch(full_document='whenAvailable',
+                                          full_document_before_change='whenAvailable',
+                                          resume_after=token, max_await_time_ms=1000) as stream:
+            scanned_at = None
+            if token is None:
+                # Events up to the scan are already counted, later ones are applied on top
+                scanned_at = self.rebuild(stream.resume_token)
+            while stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    self._heartbeat(stream.resume_token)
+                    continue
+                if scanned_at is not None and change['clusterTime'] <= scanned_at:
+                    self._save_token(change['_id'])
+                    continue
+                try:
+                    applied = self.apply(change)
+                except (TypeError, ValueError, AttributeError) as e:
+                    # A document we can't make sense of must not stop the stream on every restart
+                    logger.error(f"Failed to apply {change['operationType']}: {str(e)}")
+                    applied = False
+                if not applied:
+                    logger.warning(f"Cannot apply {change['operationType']} incrementally, rebuilding")
+                    self.aggregates_collection.update_one({'_id': AGGREGATE_ID}, {'$set': {'resume_token': None}})
+                    return
+
+    def run_forever(self):
+        self.enable_pre_images()
+        while True:
+            try:
+                self._follow()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Resume token is too old, rebuilding the portfolio aggregate")
+                    self.aggregates_collection.update_one({'_id': AGGREGATE_ID}, {'$set': {'resume_token': None}})
+                else:
+                    logger.error(f"Change stream failed: {str(e)}")
+                    time.sleep(5)
+            except PyMongoError as e:
+                logger.error(f"Change stream failed: {str(e)}")
+                time.sleep(5)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logger.info("Starting portfolio aggregator")
+    PortfolioAggregator(LazyMongo.from_env()).run_forever()
+
+
+if __name__ == "__main__":
+    main()
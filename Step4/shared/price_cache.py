@@ -0,0 +1,148 @@
+"""In-memory TTL cache for ticker prices, shared by the stocks and capital-gains services."""
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PriceCache:
+    """Size-bounded LRU cache of ticker prices.
+
+    - Fresh entries (younger than ``ttl``) are served straight from memory.
+    - Entries past ``ttl`` but within ``stale_ttl`` are served stale while a
+      background thread revalidates them (stale-while-revalidate).
+    - Unknown tickers are cached as ``None`` for ``negative_ttl`` seconds so
+      we don't keep asking the upstream API about symbols it doesn't know.
+    - If a refresh fails, a price up to ``stale_if_error`` seconds past its
+      stale window is still served instead of the error.
+
+    ``epoch`` goes up whenever a stored price changes, so results computed
+    from cached prices can tell they are out of date.
+    """
+
+    def __init__(self, ttl=30.0, stale_ttl=300.0, negative_ttl=60.0, max_entries=1024, stale_if_error=3600.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_if_error = stale_if_error
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # symbol -> (price or None, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.epoch = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.stale_if_error_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl=float(os.getenv("PRICE_CACHE_TTL", "30")),
+            stale_ttl=float(os.getenv("PRICE_CACHE_STALE_TTL", "300")),
+            negative_ttl=float(os.getenv("PRICE_CACHE_NEGATIVE_TTL", "60")),
+            max_entries=int(os.getenv("PRICE_CACHE_MAX_ENTRIES", "1024")),
+            stale_if_error=float(os.getenv("PRICE_CACHE_STALE_IF_ERROR", "3600")),
+        )
+
+    def get(self, symbol, loader):
+        """Return the price for ``symbol``, calling ``loader(symbol)`` on a miss.
+
+        ``loader`` returns the price, or ``None`` for an unknown ticker, and may
+        raise; errors are never cached.
+        """
+        symbol = symbol.upper()
+        now = time.monotonic()
+        fallback = None
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry is not None:
+                price, stored_at = entry
+                age = now - stored_at
+                if price is None:
+                    if age < self.negative_ttl:
+                        self.negative_hits += 1
+                        self._entries.move_to_end(symbol)
+                        return None
+                elif age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(symbol)
+                    return price
+                elif age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(symbol)
+                    if symbol not in self._refreshing:
+                        self._refreshing.add(symbol)
+                        threading.Thread(target=self._revalidate, args=(symbol, loader), daemon=True).start()
+                    return price
+                elif age < self.ttl + self.stale_ttl + self.stale_if_error:
+                    fallback = price
+            self.misses += 1
+
+        try:
+            price = loader(symbol)
+        except Exception as e:
+            if fallback is None:
+                raise
+            with self._lock:
+                self.stale_if_error_hits += 1
+            logger.warning(f"Serving expired price for {symbol} after refresh failure: {str(e)}")
+            return fallback
+        self.put(symbol, price)
+        return price
+
+    def peek(self, symbols):
+        """``{symbol: price}`` for the symbols ``get`` would answer without loading; the rest are left out."""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for symbol in symbols:
+                symbol = symbol.upper()
+                entry = self._entries.get(symbol)
+                if entry is None:
+                    continue
+                price, stored_at = entry
+                if now - stored_at < (self.negative_ttl if price is None else self.ttl + self.stale_ttl):
+                    found[symbol] = price
+        return found
+
+    def put(self, symbol, price):
+        symbol = symbol.upper()
+        with self._lock:
+            previous = self._entries.get(symbol)
+            if previous is None or previous[0] != price:
+                self.epoch += 1
+            self._entries[symbol] = (price, time.monotonic())
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _revalidate(self, symbol, loader):
+        try:
+            self.put(symbol, loader(symbol))
+            logger.info(f"Revalidated cached price for {symbol}")
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {symbol}, keeping stale price: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(symbol)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'epoch': self.epoch,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'stale_if_error_hits': self.stale_if_error_hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
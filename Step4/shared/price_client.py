@@ -0,0 +1,109 @@
+"""Shared client for the upstream ticker price API.
+
+Lookups go cache -> single-flight -> circuit breaker -> rate limiter ->
+provider backend, so both services share one implementation of the
+fetch/parse logic.
+"""
+import os
+import logging
+from functools import partial
+import requests
+from shared.circuit_breaker import CircuitBreaker
+from shared.price_cache import PriceCache
+from shared.price_fanout import MAX_IN_FLIGHT, fetch_prices
+from shared.price_history import PriceHistory
+from shared.price_providers import PriceApiError, provider_from_env
+from shared.rate_limiter import BACKGROUND, BULK, INTERACTIVE, MongoTokenBucket, RateLimitedError
+from shared.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def _is_upstream_failure(e):
+    # Bad symbols and malformed payloads are our problem, not a sign the provider is down
+    if isinstance(e, PriceApiError):
+        return e.status_code is not None and (e.status_code >= 500 or e.status_code == 429)
+    return isinstance(e, requests.RequestException)
+
+
+class PriceClient:
+    def __init__(self, provider, cache=None, breaker=None, limiter=None, history=None):
+        self.provider = provider
+        self.cache = cache or PriceCache()
+        self.breaker = breaker or CircuitBreaker('price-api', is_failure=_is_upstream_failure,
+                                                 ignore=(RateLimitedError,))
+        self.limiter = limiter
+        # Every quote the provider returns, for valuations back in time
+        self.history = history
+        self.flight = SingleFlight()
+        logger.info(f"Price client using provider {provider.name}")
+
+    @classmethod
+    def from_env(cls, rate_limit_collection=None, history_collection=None):
+        """Build the client from env vars.
+
+        Pass ``rate_limit_collection`` to enforce the shared upstream budget and
+        ``history_collection`` to record every fetched quote.
+        """
+        return cls(
+            provider_from_env(pool_size=MAX_IN_FLIGHT),
+            cache=PriceCache.from_env(),
+            breaker=CircuitBreaker(
+                'price-api',
+                failure_threshold=int(os.getenv("PRICE_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("PRICE_BREAKER_RESET_TIMEOUT", "30")),
+                is_failure=_is_upstream_failure,
+                ignore=(RateLimitedError,),
+            ),
+            limiter=MongoTokenBucket.from_env(rate_limit_collection) if rate_limit_collection is not None else None,
+            history=PriceHistory(history_collection) if history_collection is not None else None,
+        )
+
+    def fetch_price(self, symbol):
+        """Fetch straight from the provider, bypassing the cache; None means the ticker is unknown."""
+        return self.provider.fetch_price(symbol)
+
+    def _limited_fetch(self, symbol, priority):
+        if self.limiter is not None:
+            self.limiter.acquire(priority)
+        price = self.fetch_price(symbol)
+        if self.history is not None:
+            self.history.record(symbol, price)
+        return price
+
+    def _load(self, symbol, priority=INTERACTIVE):
+        return self.flight.do(symbol, self.breaker.call, self._limited_fetch, symbol, priority)
+
+    def get_price(self, symbol, priority=INTERACTIVE):
+        return self.cache.get(symbol, partial(self._load, priority=priority))
+
+    def get_prices(self, symbols, priority=BULK):
+        """Price the distinct symbols concurrently; failed lookups map to their exception."""
+        return fetch_prices(symbols, partial(self.get_price, priority=priority))
+
+    def cached_prices(self, symbols):
+        """Whatever the cache already holds for symbols, without asking the provider."""
+        return self.cache.peek(symbols)
+
+    def _refresh(self, symbol, priority):
+        price = self._load(symbol, priority)
+        self.cache.put(symbol, price)
+        return price
+
+    def refresh_prices(self, symbols, priority=BACKGROUND):
+        """Like get_prices, but always asks the provider and updates the cache with the answers."""
+        return fetch_prices(symbols, partial(self._refresh, priority=priority))
+
+    @property
+    def epoch(self):
+        return self.cache.epoch
+
+    def stats(self):
+        return {
+            'provider': self.provider.name,
+            'price_cache': self.cache.stats(),
+            'single_flight': self.flight.stats(),
+            'circuit_breaker': self.breaker.stats(),
+            'rate_limit': self.limiter.stats() if self.limiter is not None else None,
+            'price_history': self.history.stats() if self.history is not None else None,
+        }
@@ -0,0 +1,42 @@
+"""Bounded-concurrency fan-out of price lookups."""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_IN_FLIGHT = int(os.getenv("PRICE_FETCH_MAX_IN_FLIGHT", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Created on first use so every gunicorn worker gets its own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="price-fetch")
+        return _executor
+
+
+def fetch_prices(symbols, get_price):
+    """Look up every distinct symbol in parallel, at most MAX_IN_FLIGHT at a time.
+
+    Returns a dict mapping the upper-cased symbol to its price, or to the
+    exception raised while fetching it, so callers can aggregate and log
+    failures per symbol.
+    """
+    unique_symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    if len(unique_symbols) == 1:
+        # Nothing to overlap, skip the thread hop
+        futures = None
+    else:
+        executor = _get_executor()
+        futures = {symbol: executor.submit(get_price, symbol) for symbol in unique_symbols}
+
+    results = {}
+    for symbol in unique_symbols:
+        try:
+            results[symbol] = futures[symbol].result() if futures else get_price(symbol)
+        except Exception as e:
+            results[symbol] = e
+    return results
@@ -0,0 +1,164 @@
+"""Time series of quotes in the Mongo ``price_history`` collection, fed by the price client.
+
+Quotes are bucketed per symbol and UTC day: each bucket document holds two
+append-only arrays, ``t`` (epoch seconds) and ``p`` (prices), and a quote is
+recorded with a single ``$push``. Every process that fetches prices (the
+gunicorn workers and the price refresher) appends to the same buckets, so
+every worker sees the same history and it survives restarts.
+
+Older buckets are downsampled by ``compact``: past RAW_RETENTION only the
+last quote of every minute is kept, past a week the last of every hour, and
+past 90 days the last of every day. Every process that records quotes also
+compacts, in the background at most once per PRICE_HISTORY_COMPACT_INTERVAL,
+and a bucket remembers the resolution it was compacted to so it's only read
+again when it reaches the next tier. Lookups are as-of: the value at time t
+is the latest quote at or before t.
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+STEPS = {'minute': MINUTE, 'hour': HOUR, 'day': DAY}
+
+RAW_RETENTION = DAY
+# (age, resolution): points older than age are kept at one per resolution
+RETENTION_TIERS = ((RAW_RETENTION, MINUTE), (7 * DAY, HOUR), (90 * DAY, DAY))
+COMPACT_INTERVAL = float(os.getenv('PRICE_HISTORY_COMPACT_INTERVAL', '3600'))
+
+
+def ensure_history_indexes(history_collection):
+    history_collection.create_index([('symbol', ASCENDING), ('day', ASCENDING)], unique=True)
+
+
+def downsample(times, prices, now):
+    """Keep the last point of each bucket for points past each retention tier; times must be sorted."""
+    keep = np.ones(len(times), dtype=bool)
+    for age, resolution in RETENTION_TIERS:
+        old = times < now - age
+        if not old.any():
+            continue
+        buckets = np.floor(times / resolution)
+        last_in_bucket = np.append(buckets[1:] != buckets[:-1], True)
+        keep &= ~old | last_in_bucket
+    return times[keep], prices[keep]
+
+
+def _compacted_step(day, now):
+    """The coarsest resolution that applies to every point of the bucket for ``day``, or 0."""
+    return max((resolution for age, resolution in RETENTION_TIERS if (day + 1) * DAY <= now - age), default=0)
+
+
+class PriceHistory:
+    def __init__(self, history_collection, compact_interval=COMPACT_INTERVAL):
+        self.history_collection = history_collection
+        self.compact_interval = compact_interval
+        self.recorded = 0
+        self.record_failures = 0
+        self.compactions = 0
+        self._compacted_at = None
+        self._compact_lock = threading.Lock()
+
+    def record(self, symbol, price, at=None):
+        """Append a quote; unknown tickers (None) aren't recorded. Never raises, history is best effort."""
+        if price is None:
+            return
+        at = time.time() if at is None else at
+        try:
+            self.history_collection.update_one({'symbol': symbol.upper(), 'day': int(at // DAY)},
+                                               {'$push': {'t': at, 'p': price}}, upsert=True)
+            self.recorded += 1
+        except Exception as e:
+            self.record_failures += 1
+            logger.warning(f"Could not record price history for {symbol}: {str(e)}")
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        # Off the caller's thread: record runs on the price lookup path
+        with self._compact_lock:
+            now = time.monotonic()
+            if self._compacted_at is not None and now - self._compacted_at < self.compact_interval:
+                return
+            self._compacted_at = now
+        threading.Thread(target=self._compact_in_background, name='price-history-compact', daemon=True).start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+            self.compactions += 1
+        except Exception as e:
+            logger.error(f"Price history compaction failed: {str(e)}")
+
+    def _series(self, symbols, start, end):
+        """``{symbol: (times, prices)}`` sorted by time, covering [start, end] plus the last quote before start."""
+        first_day, last_day = int(start // DAY), int(end // DAY)
+        buckets = {symbol: [] for symbol in symbols}
+        for doc in self.history_collection.find({'symbol': {'$in': symbols}, 'day': {'$gte': first_day, '$lte': last_day}},
+                                                {'_id': 0, 'symbol': 1, 't': 1, 'p': 1}):
+            buckets[doc['symbol']].append(doc)
+        # The value at `start` may come from an earlier day: the latest bucket before it, per symbol
+        for doc in self.history_collection.aggregate([
+            {'$match': {'symbol': {'$in': symbols}, 'day': {'$lt': first_day}}},
+            {'$sort': {'symbol': ASCENDING, 'day': DESCENDING}},
+            {'$group': {'_id': '$symbol', 't': {'$first': '$t'}, 'p': {'$first': '$p'}}},
+        ]):
+            buckets[doc['_id']].append(doc)
+
+        series = {}
+        for symbol, docs in buckets.items():
+            times = np.array([t for doc in docs for t in doc.get('t', [])], dtype=np.float64)
+            prices = np.array([p for doc in docs for p in doc.get('p', [])], dtype=np.float64)
+            # Several processes append to a bucket, so quotes can land slightly out of order
+            order = np.argsort(times, kind='stable')
+            series[symbol] = times[order], prices[order]
+        return series
+
+    def matrix(self, symbols, times):
+        """Prices as of each of ``times`` for each symbol, shape (len(symbols), len(times)); NaN before the first quote."""
+        times = np.asarray(times, dtype=np.float64)
+        symbols = [symbol.upper() for symbol in symbols]
+        result = np.full((len(symbols), len(times)), np.nan)
+        if not len(times) or not symbols:
+            return result
+        series = self._series(symbols, times[0], times[-1])
+        for row, symbol in enumerate(symbols):
+            quote_times, prices = series[symbol]
+            if not len(quote_times):
+                continue
+            positions = np.searchsorted(quote_times, times, side='right') - 1
+            known = positions >= 0
+            result[row, known] = prices[positions[known]]
+        return result
+
+    def compact(self, now=None):
+        """Downsample buckets that reached a new retention tier; returns how many buckets were rewritten."""
+        now = time.time() if now is None else now
+        # Only buckets not yet compacted to the resolution their age calls for
+        due = [{'day': {'$lt': int((now - age) // DAY)}, 'step': {'$not': {'$gte': resolution}}}
+               for age, resolution in RETENTION_TIERS]
+        compacted = 0
+        for doc in self.history_collection.find({'$or': due}):
+            times = np.array(doc.get('t', []), dtype=np.float64)
+            prices = np.array(doc.get('p', []), dtype=np.float64)
+            order = np.argsort(times, kind='stable')
+            kept_times, kept_prices = downsample(times[order], prices[order], now)
+            # Only rewrite if nobody appended in the meantime
+            result = self.history_collection.update_one(
+                {'_id': doc['_id'], 't': {'$size': len(times)}},
+                {'$set': {'t': kept_times.tolist(), 'p': kept_prices.tolist(),
+                          'step': _compacted_step(doc['day'], now)}})
+            if len(kept_times) < len(times):
+                compacted += result.modified_count
+        if compacted:
+            logger.info(f"Downsampled {compacted} price history buckets")
+        return compacted
+
+    def stats(self):
+        return {'recorded': self.recorded, 'record_failures': self.record_failures, 'compactions': self.compactions}
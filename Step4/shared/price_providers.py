@@ -0,0 +1,127 @@
+"""Upstream price provider backends, selected with the PRICE_PROVIDER env var.
+
+- ``api-ninjas`` (default): the real API at PRICE_API_URL, keyed by NINJA_API_KEY
+- ``mock``: the bundled mock_price_server, which speaks the same protocol
+- ``record``: the configured HTTP backend, appending every quote to PRICE_RECORD_FILE
+- ``replay``: plays quotes back from PRICE_RECORD_FILE without any network calls
+"""
+import os
+import json
+import threading
+import time
+import logging
+from collections import defaultdict
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_NINJAS_URL = 'https://api.api-ninjas.com/v1/stockprice'
+MOCK_URL = 'http://mock-prices:8090/v1/stockprice'
+
+
+class PriceApiError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class HttpPriceProvider:
+    """Talks to an api-ninjas compatible ``stockprice`` endpoint over a pooled keep-alive session."""
+
+    def __init__(self, base_url, api_key=None, connect_timeout=3.05, read_timeout=5.0, pool_size=10):
+        self.name = base_url
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+
+        # One keep-alive connection pool per process, sized for the fan-out pool
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers.update({"X-Api-Key": api_key})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch_price(self, symbol):
+        """Fetch the current price; None means the ticker is unknown."""
+        response = self.session.get(self.base_url, params={'ticker': symbol}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise PriceApiError(f"API response code {response.status_code}", response.status_code)
+
+        api_response = response.json()
+
+        # Handle API response formats
+        if isinstance(api_response, list):
+            return api_response[0].get('price', 0.0) if len(api_response) > 0 else None
+        elif isinstance(api_response, dict):
+            return api_response.get('price', 0.0)
+        raise PriceApiError(f"Unexpected API response format: {api_response}")
+
+
+class RecordingPriceProvider:
+    """Wraps another provider and appends every successful quote to a JSON-lines file."""
+
+    def __init__(self, inner, path):
+        self.name = f"record({inner.name})"
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def fetch_price(self, symbol):
+        price = self.inner.fetch_price(symbol)
+        line = json.dumps({'symbol': symbol, 'price': price, 'recorded_at': time.time()})
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+        return price
+
+
+class ReplayPriceProvider:
+    """Serves quotes captured by RecordingPriceProvider.
+
+    Each symbol replays its recorded quotes in order and wraps around, so a
+    benchmark run sees the same price sequence every time. Symbols that were
+    never recorded are reported as unknown.
+    """
+
+    def __init__(self, path):
+        self.name = f"replay({path})"
+        self._quotes = defaultdict(list)
+        self._positions = defaultdict(int)
+        self._lock = threading.Lock()
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    quote = json.loads(line)
+                    self._quotes[quote['symbol'].upper()].append(quote['price'])
+        logger.info(f"Loaded recorded quotes for {len(self._quotes)} symbols from {path}")
+
+    def fetch_price(self, symbol):
+        quotes = self._quotes.get(symbol.upper())
+        if not quotes:
+            return None
+        with self._lock:
+            position = self._positions[symbol.upper()]
+            self._positions[symbol.upper()] = position + 1
+        return quotes[position % len(quotes)]
+
+
+def provider_from_env(pool_size=10):
+    kind = os.getenv('PRICE_PROVIDER', 'api-ninjas')
+    record_file = os.getenv('PRICE_RECORD_FILE', 'logs/price_quotes.jsonl')
+    if kind == 'replay':
+        return ReplayPriceProvider(record_file)
+
+    default_url = MOCK_URL if kind == 'mock' else API_NINJAS_URL
+    http = HttpPriceProvider(
+        os.getenv('PRICE_API_URL', default_url),
+        api_key=os.getenv('NINJA_API_KEY'),
+        connect_timeout=float(os.getenv("PRICE_API_CONNECT_TIMEOUT", "3.05")),
+        read_timeout=float(os.getenv("PRICE_API_READ_TIMEOUT", "5")),
+        pool_size=pool_size,
+    )
+    if kind == 'record':
+        return RecordingPriceProvider(http, record_file)
+    if kind not in ('api-ninjas', 'mock'):
+        raise ValueError(f"Unknown PRICE_PROVIDER '{kind}'")
+    return http
@@ -0,0 +1,63 @@
+"""Background worker that keeps the ``prices`` collection fresh for every held symbol.
+
+Run it as its own process so the gunicorn workers never fetch on the request path:
+    python -m shared.price_refresher
+"""
+import os
+import time
+import logging
+from shared.mongo import LazyMongo
+from shared.price_client import PriceClient
+from shared.price_history import ensure_history_indexes
+from shared.price_store import ensure_price_indexes, save_quotes, utcnow
+
+logger = logging.getLogger(__name__)
+
+
+class PriceRefresher:
+    def __init__(self, stocks_collection, prices_collection, price_client, interval=60.0):
+        self.stocks_collection = stocks_collection
+        self.prices_collection = prices_collection
+        self.price_client = price_client
+        self.interval = interval
+
+    def refresh_once(self):
+        symbols = {symbol.upper() for symbol in self.stocks_collection.distinct('symbol') if symbol}
+        if not symbols:
+            return 0
+        fetched_at = utcnow()
+        quotes = self.price_client.refresh_prices(symbols)
+        fetched = {symbol: price for symbol, price in quotes.items() if not isinstance(price, Exception)}
+        for symbol, error in quotes.items():
+            if isinstance(error, Exception):
+                logger.error(f"Failed to refresh price for {symbol}: {str(error)}")
+        save_quotes(self.prices_collection, fetched, fetched_at)
+        logger.info(f"Refreshed {len(fetched)}/{len(symbols)} quotes")
+        return len(fetched)
+
+    def run_forever(self):
+        ensure_price_indexes(self.prices_collection)
+        if self.price_client.history is not None:
+            ensure_history_indexes(self.price_client.history.history_collection)
+        while True:
+            started = time.monotonic()
+            try:
+                self.refresh_once()
+            except Exception as e:
+                logger.error(f"Price refresh cycle failed: {str(e)}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    mongo = LazyMongo.from_env()
+    price_client = PriceClient.from_env(rate_limit_collection=mongo.collection("rate_limits"),
+                                        history_collection=mongo.collection("price_history"))
+    refresher = PriceRefresher(mongo.collection("stocks"), mongo.collection("prices"), price_client,
+                               interval=float(os.getenv("PRICE_REFRESH_INTERVAL", "60")))
+    logger.info(f"Starting price refresher, interval {refresher.interval}s")
+    refresher.run_forever()
+
+
+if __name__ == "__main__":
+    main()
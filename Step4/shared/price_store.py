@@ -0,0 +1,126 @@
+"""Quotes materialized in the Mongo ``prices`` collection (symbol, price, fetched_at).
+
+The background refresher keeps the collection warm; request handlers read
+from it and only fall back to a live fetch for quotes older than
+``max_staleness`` seconds, writing the fresh quote back for everyone else.
+"""
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, UpdateOne
+from shared.price_client import PriceClient
+from shared.price_history import ensure_history_indexes
+from shared.rate_limiter import BULK, INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+USE_PRICE_STORE = os.getenv('USE_PRICE_STORE', 'false').lower() == 'true'
+
+
+def utcnow():
+    # Mongo hands dates back as naive UTC, so compare against the same
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def ensure_price_indexes(prices_collection):
+    prices_collection.create_index([('symbol', ASCENDING)], unique=True)
+
+
+def save_quotes(prices_collection, quotes, fetched_at=None):
+    """Upsert ``{symbol: price}`` in one round trip. Unknown tickers are stored with price None."""
+    if not quotes:
+        return
+    fetched_at = fetched_at or utcnow()
+    prices_collection.bulk_write([
+        UpdateOne({'symbol': symbol}, {'$set': {'price': price, 'fetched_at': fetched_at}}, upsert=True)
+        for symbol, price in quotes.items()
+    ], ordered=False)
+
+
+def price_source_from_env(mongo):
+    """Return ``(price_client, price_source)`` for a service, ensuring their indexes once connected.
+
+    The client is pooled, cached, circuit-broken and rate-limited, and records every quote it
+    fetches in ``price_history``. ``price_source`` is what handlers price holdings with: the
+    client itself, or with USE_PRICE_STORE (the background refresher running) a PriceStore
+    reading quotes from the ``prices`` collection.
+    """
+    history_collection = mongo.collection('price_history')
+    price_client = PriceClient.from_env(rate_limit_collection=mongo.collection('rate_limits'),
+                                        history_collection=history_collection)
+    mongo.after_connect(lambda: ensure_history_indexes(history_collection))
+    if not USE_PRICE_STORE:
+        return price_client, price_client
+    prices_collection = mongo.collection('prices')
+    mongo.after_connect(lambda: ensure_price_indexes(prices_collection))
+    return price_client, PriceStore.from_env(prices_collection, price_client)
+
+
+class PriceStore:
+    """Same lookup interface as PriceClient, backed by the ``prices`` collection."""
+
+    def __init__(self, prices_collection, price_client, max_staleness=120.0):
+        self.prices_collection = prices_collection
+        self.price_client = price_client
+        self.max_staleness = max_staleness
+        self.store_hits = 0
+        self.live_fallbacks = 0
+
+    @classmethod
+    def from_env(cls, prices_collection, price_client):
+        return cls(prices_collection, price_client,
+                   max_staleness=float(os.getenv('PRICE_STORE_MAX_STALENESS', '120')))
+
+    def get_prices(self, symbols, priority=BULK):
+        """Price the distinct symbols; failed lookups map to their exception."""
+        wanted = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        fresh_after = utcnow() - timedelta(seconds=self.max_staleness)
+
+        results = {}
+        for doc in self.prices_collection.find({'symbol': {'$in': wanted}, 'fetched_at': {'$gte': fresh_after}},
+                                               {'_id': 0, 'symbol': 1, 'price': 1}):
+            results[doc['symbol']] = doc['price']
+        self.store_hits += len(results)
+
+        missing = [symbol for symbol in wanted if symbol not in results]
+        if missing:
+            self.live_fallbacks += len(missing)
+            logger.info(f"Quotes missing or stale for {missing}, fetching live")
+            live = self.price_client.get_prices(missing, priority)
+            fetched = {symbol: price for symbol, price in live.items() if not isinstance(price, Exception)}
+            try:
+                save_quotes(self.prices_collection, fetched)
+            except Exception as e:
+                logger.warning(f"Failed to write back live quotes: {str(e)}")
+            results.update(live)
+        return results
+
+    def cached_prices(self, symbols):
+        """Stored quotes no older than max_staleness, topped up from the in-memory cache; never fetches."""
+        wanted = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        fresh_after = utcnow() - timedelta(seconds=self.max_staleness)
+        results = {doc['symbol']: doc['price'] for doc in
+                   self.prices_collection.find({'symbol': {'$in': wanted}, 'fetched_at': {'$gte': fresh_after}},
+                                               {'_id': 0, 'symbol': 1, 'price': 1})}
+        results.update(self.price_client.cached_prices([symbol for symbol in wanted if symbol not in results]))
+        return results
+
+    def get_price(self, symbol, priority=INTERACTIVE):
+        price = self.get_prices([symbol], priority)[symbol.upper()]
+        if isinstance(price, Exception):
+            raise price
+        return price
+
+    @property
+    def epoch(self):
+        # Only live fallbacks move this; quotes the refresher writes to Mongo don't
+        return self.price_client.epoch
+
+    def stats(self):
+        stats = self.price_client.stats()
+        stats['price_store'] = {
+            'max_staleness': self.max_staleness,
+            'store_hits': self.store_hits,
+            'live_fallbacks': self.live_fallbacks,
+        }
+        return stats
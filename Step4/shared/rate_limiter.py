@@ -0,0 +1,111 @@
+"""Token bucket for upstream price calls, shared by every worker of both services.
+
+The bucket lives in a single Mongo document and is refilled and debited in
+one atomic pipeline update evaluated with the server clock ($$NOW), so all
+processes see the same budget regardless of local clock drift.
+
+Lower priority classes may only spend tokens above a reserved floor, which
+keeps headroom for interactive single-stock lookups when bulk valuations
+or the background refresher burst.
+"""
+import os
+import threading
+import time
+import logging
+from datetime import timezone
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+BACKGROUND = 'background'
+
+# Share of the bucket a priority class has to leave untouched
+RESERVED_FRACTION = {INTERACTIVE: 0.0, BULK: 0.2, BACKGROUND: 0.5}
+
+
+class RateLimitedError(Exception):
+    pass
+
+
+class MongoTokenBucket:
+    def __init__(self, collection, name, rate, capacity, max_wait=None):
+        self.collection = collection
+        self.name = name
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        # How long each priority class may queue for a token before giving up
+        self.max_wait = max_wait or {INTERACTIVE: 2.0, BULK: 1.0, BACKGROUND: 10.0}
+        self._lock = threading.Lock()
+        self.counters = {priority: {'granted': 0, 'queued': 0, 'denied': 0} for priority in RESERVED_FRACTION}
+
+    @classmethod
+    def from_env(cls, collection):
+        rate = float(os.getenv('PRICE_RATE_LIMIT_PER_SEC', '0'))
+        if rate <= 0:
+            return None
+        return cls(collection, 'price-api', rate, float(os.getenv('PRICE_RATE_LIMIT_BURST', str(rate * 10))))
+
+    def _refill(self):
+        # Tokens accrued since the last update, capped at capacity
+        elapsed = {'$divide': [{'$subtract': ['$$NOW', {'$ifNull': ['$updated_at', '$$NOW']}]}, 1000]}
+        return {'$min': [self.capacity, {'$add': [{'$ifNull': ['$tokens', self.capacity]},
+                                                  {'$multiply': [elapsed, self.rate]}]}]}
+
+    def _try_take(self, floor):
+        doc = self.collection.find_one_and_update(
+            {'_id': self.name},
+            [
+                {'$set': {'tokens': self._refill(), 'updated_at': '$$NOW'}},
+                {'$set': {'granted': {'$gte': ['$tokens', floor + 1]}}},
+                {'$set': {'tokens': {'$cond': ['$granted', {'$subtract': ['$tokens', 1]}, '$tokens']}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc['granted'], doc['tokens']
+
+    def acquire(self, priority=INTERACTIVE):
+        """Take one token, queueing up to the priority's max wait; raises RateLimitedError if none is freed."""
+        floor = self.capacity * RESERVED_FRACTION[priority]
+        deadline = time.monotonic() + self.max_wait[priority]
+        queued = False
+        while True:
+            granted, tokens = self._try_take(floor)
+            if granted:
+                self._count(priority, 'granted')
+                return
+            wait = (floor + 1 - tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                self._count(priority, 'denied')
+                raise RateLimitedError(f"Upstream budget exhausted for {priority} calls")
+            if not queued:
+                self._count(priority, 'queued')
+                queued = True
+            time.sleep(wait)
+
+    def _count(self, priority, outcome):
+        with self._lock:
+            self.counters[priority][outcome] += 1
+
+    def remaining(self):
+        doc = self.collection.find_one({'_id': self.name})
+        if doc is None:
+            return self.capacity
+        elapsed = time.time() - doc['updated_at'].replace(tzinfo=timezone.utc).timestamp()
+        return min(self.capacity, doc['tokens'] + max(elapsed, 0) * self.rate)
+
+    def stats(self):
+        try:
+            remaining = round(self.remaining(), 2)
+        except Exception as e:
+            logger.warning(f"Could not read rate limit budget: {str(e)}")
+            remaining = None
+        with self._lock:
+            return {
+                'rate_per_sec': self.rate,
+                'capacity': self.capacity,
+                'remaining': remaining,
+                'by_priority': {priority: dict(counts) for priority, counts in self.counters.items()},
+            }
@@ -0,0 +1,77 @@
+"""Bounded cache of computed responses, tagged with the inputs' versions.
+
+Each entry remembers the holdings version and price epoch it was computed
+at. A lookup only hits when both still match and the entry is younger than
+``ttl``; the ttl bounds how long a result can outlive prices that changed
+somewhere this process can't see (e.g. quotes written by the refresher).
+``get`` reports why it missed, using RFC 9211 ``Cache-Status`` terms.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+HIT = 'hit'
+MISS = 'miss'
+STALE = 'stale'
+
+
+class ResultCache:
+    def __init__(self, name, ttl=30.0, max_entries=256):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, versions, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls, name):
+        return cls(
+            name,
+            # Defaults to the price cache TTL so a cached result is never older than the prices behind it
+            ttl=float(os.getenv('RESULT_CACHE_TTL', os.getenv('PRICE_CACHE_TTL', '30'))),
+            max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '256')),
+        )
+
+    def get(self, key, versions):
+        """Return ``(value, HIT)``, or ``(None, MISS)`` / ``(None, STALE)`` when it has to be recomputed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, MISS
+            value, stored_versions, stored_at = entry
+            if stored_versions != versions or time.monotonic() - stored_at >= self.ttl:
+                self.stale += 1
+                return None, STALE
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value, HIT
+
+    def put(self, key, versions, value):
+        with self._lock:
+            self._entries[key] = (value, versions, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def header(self, status):
+        """``Cache-Status`` value for a lookup outcome, or for 'bypass' when the cache wasn't consulted."""
+        return f'{self.name}; hit' if status == HIT else f'{self.name}; fwd={status}'
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+            }
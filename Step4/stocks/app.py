@@ -1,10 +1,29 @@
 import os
+import io
+import csv
+import json
+import time
 import requests
-from flask import Flask, request, jsonify
-from datetime import datetime
-from pymongo import MongoClient
+import numpy as np
+from flask import Flask, Response, request, jsonify
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from pymongo import ASCENDING, UpdateOne
+from pymongo.collation import Collation
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
 import logging
+from shared.broadcaster import Broadcaster
+from shared.circuit_breaker import CircuitOpenError
+from shared.holdings_snapshot import VERSIONS_COLLECTION, HoldingsSnapshot, bump_version
+from shared.mongo import LazyMongo
+from shared.health import health_blueprint
+from shared.price_history import DAY, STEPS
+from shared.portfolio_aggregates import USE_PORTFOLIO_AGGREGATES, read_positions
+from shared.rate_limiter import RateLimitedError
+from shared.price_client import PriceApiError
+from shared.price_store import price_source_from_env
 
 # Configure logging
 os.makedirs('logs', exist_ok=True)
@@ -29,20 +48,56 @@ logger.addHandler(console_handler)
 
 logger.info("Logging setup complete. Service is running.")
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)  # Prevents hanging
-    db = client["stocks_db"]
-    stocks_collection = db["stocks"]
-    client.server_info()  # Test connection
-    logger.info("Successfully connected to MongoDB")
-except Exception as e:
-    logger.error(f"Failed to connect to MongoDB: {str(e)}")
-    raise
+# Each worker connects on first use, see gunicorn.conf.py; /readyz reports whether MongoDB is reachable
+mongo = LazyMongo.from_env()
+stocks_collection = mongo.collection("stocks")
+# GET handlers may be served by secondaries (MONGO_READ_PREFERENCE); writes always go to the primary
+stocks_reads = mongo.read_collection("stocks")
+aggregates_collection = mongo.collection("portfolio_aggregates")
+versions_collection = mongo.collection(VERSIONS_COLLECTION)
 
-API_KEY = 'RMRgIp4laaBoVSyyoEg3oQ==kpRILqdNoYvzkjzX'
-BASE_URL = 'https://api.api-ninjas.com/v1/stockprice'
+# python: read and sum holding by holding; snapshot: vectorized over the in-memory holdings snapshot,
+# reloaded only when holdings change (see shared/holdings_snapshot.py)
+PORTFOLIO_VALUE_ENGINE = os.getenv('PORTFOLIO_VALUE_ENGINE', 'python')
 
+# Symbols compare case-insensitively; queries must pass the same collation to use the index
+SYMBOL_COLLATION = Collation(locale='en', strength=2)
+
+
+@mongo.after_connect
+def ensure_stock_indexes():
+    try:
+        stocks_collection.create_index([('symbol', ASCENDING)], name='symbol_unique_ci',
+                                       unique=True, collation=SYMBOL_COLLATION)
+        logger.info("Stock indexes are in place")
+    except OperationFailure as e:
+        # Most likely pre-existing duplicates that differ only in case
+        logger.error(f"Failed to create unique symbol index: {str(e)}")
+
+
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+price_client, price_source = price_source_from_env(mongo)
+
+
+def get_ticker_price(symbol):
+    return price_source.get_price(symbol)
+
+
+def current_portfolio_value():
+    holdings = portfolio_snapshot.holdings()
+    value = holdings.market_value(price_source.get_prices(holdings.held_symbols()))
+    return {'portfolio_value': round(value, 2)}
+
+
+# Every dashboard streaming the portfolio value shares one valuation loop per worker: holdings are
+# reloaded only when their version moves and prices come from the cache, so a new value goes out
+# only when holdings change or a tracked price moves
+portfolio_snapshot = HoldingsSnapshot(stocks_collection, versions_collection)
+portfolio_stream = Broadcaster('portfolio-value', current_portfolio_value,
+                               interval=float(os.getenv('PORTFOLIO_STREAM_INTERVAL', '2')))
+PORTFOLIO_STREAM_HEARTBEAT = float(os.getenv('PORTFOLIO_STREAM_HEARTBEAT', '15'))
 
 
 app = Flask(__name__)
@@ -52,48 +107,273 @@ app.logger.setLevel(logging.INFO)
 logger.info("Flask is now using our logging system.")
 app.logger.info("Flask is now using our logging system.")
 
+
+# POST endpoints that only read, so they don't invalidate holdings snapshots
+READ_ONLY_ENDPOINTS = {'fetch_stock_values'}
+
+
+@app.after_request
+def bump_holdings_version(response):
+    # Any write may have changed holdings (even a failed batch can be partly applied),
+    # so readers holding a snapshot reload on their next version poll
+    if (request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and request.path.startswith('/stocks')
+            and request.endpoint not in READ_ONLY_ENDPOINTS):
+        try:
+            bump_version(versions_collection)
+        except Exception as e:
+            logger.error(f"Could not bump the holdings version: {str(e)}")
+    return response
+
 @app.route('/')
 def home():
     logger.info(f"Home endpoint accessed")
     return "Welcome to the Stock Portfolio API! Use the available endpoints to interact with the service."
 
 
-@app.route('/stocks', methods=['POST'])
-def add_stock():
-    data = request.get_json()
-    if not data or 'symbol' not in data or 'purchase price' not in data or 'shares' not in data:
-        logger.warning("Malformed stock data received")
-        return jsonify({'error': 'Malformed data'}), 400
-
+def validate_stock(data):
+    """Return why a holding can't be stored, or None if it is valid."""
+    if not isinstance(data, dict) or 'symbol' not in data or 'purchase price' not in data or 'shares' not in data:
+        return 'Malformed data'
     try:
         datetime.strptime(data["purchase date"], "%d-%m-%Y")
     except ValueError:
-        logger.warning("Invalid date format in stock data")
-        return jsonify({'error': 'Invalid date format. Expected DD-MM-YYYY'}), 400
+        return 'Invalid date format. Expected DD-MM-YYYY'
+    return None
+
+
+def build_stock(data):
+    return {
+        'name': data.get('name', 'NA'),
+        'symbol': data['symbol'].upper(),
+        'purchase price': round(float(data['purchase price']), 2),
+        'shares': int(data['shares']),
+        'price': data.get('price', 0.0),
+        'purchase date': data.get('purchase date', 'NA')
+    }
+
+
+def insert_stocks(indexed_stocks, ordered=False):
+    """Insert ``(index, stock)`` pairs with chunked insert_many calls.
+
+    Returns ``{index: {'id': ...}}`` or ``{index: {'error': ...}}`` for every
+    pair. An ordered insert stops at the first failure and reports the rest
+    as not attempted.
+    """
+    results = {}
+    stopped = False
+    for start in range(0, len(indexed_stocks), BATCH_CHUNK_SIZE):
+        chunk = indexed_stocks[start:start + BATCH_CHUNK_SIZE]
+        if stopped:
+            for index, _ in chunk:
+                results[index] = {'error': 'Not attempted, an earlier stock in the ordered batch failed'}
+            continue
+
+        write_errors = {}
+        try:
+            stocks_collection.insert_many([stock for _, stock in chunk], ordered=ordered)
+        except BulkWriteError as e:
+            write_errors = {error['index']: error for error in e.details.get('writeErrors', [])}
+
+        first_error = min(write_errors) if write_errors else None
+        for position, (index, stock) in enumerate(chunk):
+            if position in write_errors:
+                error = write_errors[position]
+                results[index] = {'error': 'Stock with this symbol already exists' if error.get('code') == 11000
+                                  else error.get('errmsg', 'Insert failed')}
+            elif ordered and first_error is not None and position > first_error:
+                results[index] = {'error': 'Not attempted, an earlier stock in the ordered batch failed'}
+            else:
+                # insert_many fills in _id on the documents it sends
+                results[index] = {'id': str(stock['_id'])}
+        stopped = ordered and first_error is not None
+    return results
+
+
+@app.route('/stocks', methods=['POST'])
+def add_stock():
+    data = request.get_json()
+    error = validate_stock(data)
+    if error:
+        logger.warning(f"Rejected stock data: {error}")
+        return jsonify({'error': error}), 400
 
-    if stocks_collection.find_one({'symbol': data['symbol'].upper()}):
-        logger.error(f"Stock with symbol {data['symbol']} already exists")
-        return jsonify({'error': 'Stock with this symbol already exists'}), 400
     try:
-        stock = {
-            'name': data.get('name', 'NA'),
-            'symbol': data['symbol'],
-            'purchase price': round(float(data['purchase price']), 2),
-            'shares': int(data['shares']),
-            'price': data.get('price', 0.0),
-            'purchase date': data.get('purchase date', 'NA')
-        }
-        # Insert into database
+        stock = build_stock(data)
+        # Insert into database, the unique symbol index rejects duplicates
         result = stocks_collection.insert_one(stock)
         stock_id = str(result.inserted_id)
         logger.info(f"Successfully added stock with ID: {stock_id}")
         return jsonify({'id': stock_id}), 201
 
+    except DuplicateKeyError:
+        logger.error(f"Stock with symbol {data['symbol']} already exists")
+        return jsonify({'error': 'Stock with this symbol already exists'}), 400
+
     except Exception as e:
         logger.error(f"Error adding stock: {str(e)}")
         return jsonify({'error': 'An error occurred while adding the stock', 'details': str(e)}), 500
 
 
+@app.route('/stocks/batch', methods=['POST'])
+def add_stocks_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        logger.warning("Malformed batch received")
+        return jsonify({'error': 'Malformed data. Expected a non-empty JSON array of stocks'}), 400
+
+    ordered = request.args.get('ordered', 'false').lower() == 'true'
+    logger.info(f"Received batch of {len(data)} stocks (ordered: {ordered})")
+
+    try:
+        results = {}
+        valid = []
+        for index, item in enumerate(data):
+            try:
+                error = validate_stock(item)
+                if not error:
+                    valid.append((index, build_stock(item)))
+                    continue
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                error = f'Malformed data: {str(e)}'
+            results[index] = {'error': error}
+            if ordered:
+                # Nothing after the first failure is written
+                for rest in range(index + 1, len(data)):
+                    results[rest] = {'error': 'Not attempted, an earlier stock in the ordered batch failed'}
+                break
+
+        results.update(insert_stocks(valid, ordered))
+        items = [dict(results[index], index=index) for index in range(len(data))]
+        inserted = sum(1 for item in items if 'id' in item)
+        logger.info(f"Batch insert finished: {inserted} inserted, {len(items) - inserted} failed")
+
+        status = 201 if inserted == len(items) else 207 if inserted else 400
+        return jsonify({'inserted': inserted, 'failed': len(items) - inserted, 'results': items}), status
+
+    except Exception as e:
+        logger.error(f"Error adding stock batch: {str(e)}")
+        return jsonify({'error': 'An error occurred while adding the stocks', 'details': str(e)}), 500
+
+
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+
+
+def import_rows(stream, fmt):
+    """Yield ``(row number, holding or parse error)`` from a CSV or NDJSON byte stream, one line at a time."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        # Accept "purchase_price" / "Purchase Price" style headers too
+        reader.fieldnames = [name.strip().lower().replace('_', ' ') for name in reader.fieldnames or []]
+        for row in reader:
+            yield reader.line_num, {field: value.strip() for field, value in row.items()
+                                    if field and value and value.strip()}
+    else:
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, ValueError(f'Invalid JSON: {str(e)}')
+
+
+@app.route('/stocks/import', methods=['POST'])
+def import_stocks():
+    """Import holdings from a streamed CSV (header row) or NDJSON body, inserting in chunks as rows arrive."""
+    content_type = request.mimetype
+    fmt = request.args.get('format') or ('csv' if content_type == 'text/csv' else
+                                         'ndjson' if content_type in ('application/x-ndjson', 'application/jsonl')
+                                         else None)
+    if fmt not in ('csv', 'ndjson'):
+        logger.warning(f"Rejected import with content type {content_type}")
+        return jsonify({'error': 'Expected a text/csv or application/x-ndjson body, or ?format=csv|ndjson'}), 400
+
+    inserted = 0
+    failed = 0
+    errors = []
+    pending = []
+
+    def record_error(row, error):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({'row': row, 'error': error})
+
+    def flush():
+        nonlocal inserted
+        for row, result in insert_stocks(pending).items():
+            if 'id' in result:
+                inserted += 1
+            else:
+                record_error(row, result['error'])
+        pending.clear()
+
+    try:
+        logger.info(f"Importing {fmt} stocks")
+        for row, item in import_rows(request.stream, fmt):
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                if fmt == 'csv' and 'price' in item:
+                    # CSV cells are strings; build_stock converts everything but price
+                    item['price'] = float(item['price'])
+                error = validate_stock(item)
+                if not error:
+                    pending.append((row, build_stock(item)))
+                    if len(pending) >= BATCH_CHUNK_SIZE:
+                        flush()
+                    continue
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                error = f'Malformed data: {str(e)}'
+            record_error(row, error)
+        flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        logger.error(f"Import aborted after {inserted} stocks: {str(e)}")
+        flush()
+        record_error(None, f'Unreadable input: {str(e)}')
+    except Exception as e:
+        logger.error(f"Error importing stocks: {str(e)}")
+        return jsonify({'error': 'An error occurred while importing the stocks', 'details': str(e),
+                        'inserted': inserted}), 500
+
+    logger.info(f"Import finished: {inserted} inserted, {failed} failed")
+    status = 201 if inserted and not failed else 207 if inserted else 400
+    return jsonify({'inserted': inserted, 'failed': failed, 'errors': errors,
+                    'errors_truncated': failed > len(errors)}), status
+
+
+def stream_json_array(cursor):
+    """Yield a JSON array one document at a time, as the cursor fetches batches from Mongo."""
+    yield '['
+    first = True
+    try:
+        for stock in cursor:
+            stock['_id'] = str(stock['_id'])
+            yield ('' if first else ',') + json.dumps(stock)
+            first = False
+    except Exception as e:
+        # Headers are already sent; re-raising aborts the response, so the client gets an
+        # unterminated array instead of one that silently lacks the remaining stocks
+        logger.error(f"Error while streaming stocks: {str(e)}")
+        raise
+    yield ']'
+
+
+def positive_int_arg(name, default=None):
+    """Read a query parameter that must be a positive integer; raises ValueError otherwise."""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise ValueError(f'{name} must be a positive integer')
+    return number
+
+
 @app.route('/stocks', methods=['GET'])
 def get_stocks():
     try:
@@ -109,26 +389,134 @@ def get_stocks():
         # Use MongoDB filter directly for efficiency
         query = {'symbol': symbol} if symbol else {}
 
-        # Fetch stocks from the database
-        result = list(stocks_collection.find(query))
+        # Cursor pagination: ?limit=N&after=<last _id of the previous page>
+        try:
+            limit = positive_int_arg('limit')
+            batch_size = positive_int_arg('batch_size', STREAM_BATCH_SIZE)
+        except ValueError as e:
+            logger.warning(f"Invalid query parameter: {str(e)}")
+            return jsonify({'error': str(e)}), 400
+        after = request.args.get('after')
+        if after:
+            try:
+                query['_id'] = {'$gt': ObjectId(after)}
+            except InvalidId:
+                logger.warning(f"Invalid pagination cursor: {after}")
+                return jsonify({'error': 'Invalid cursor'}), 400
+
+        # Fetch stocks from the database, matching the symbol index case-insensitively. Only symbol
+        # lookups get the collation: under it an unfiltered page can't walk the _id index in order
+        # and would scan and sort the whole collection instead
+        cursor = stocks_reads.find(query)
+        if symbol:
+            cursor = cursor.collation(SYMBOL_COLLATION)
+        if limit or after:
+            cursor = cursor.sort('_id', ASCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        if request.args.get('stream', 'false').lower() == 'true':
+            logger.info(f"Streaming stocks in batches of {batch_size}")
+            return Response(stream_json_array(cursor.batch_size(batch_size)), mimetype='application/json')
+
+        result = list(cursor)
         logger.info(f"Found {len(result)} stocks matching query")
 
         # Convert ObjectId to string
         for stock in result:
             stock['_id'] = str(stock['_id'])
 
-        return jsonify(result), 200
+        response = jsonify(result)
+        if limit and len(result) == limit:
+            next_cursor = result[-1]['_id']
+            response.headers['X-Next-Cursor'] = next_cursor
+            args = dict(request.args, after=next_cursor)
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return response, 200
 
     except Exception as e:
         logger.error(f"Error getting stocks: {str(e)}")
         return jsonify({'error': 'An internal server error occurred', 'details': str(e)}), 500
 
 
+EXPORT_FIELDS = ['id', 'name', 'symbol', 'purchase price', 'shares', 'price', 'purchase date']
+VALUE_FIELDS = ['ticker', 'stock_value']
+
+
+def valued(stocks):
+    """Add the cached price and value to a batch of stocks; symbols with no cached price are left empty."""
+    # Never fetches: a live lookup mid-stream would stall the export on upstream timeouts and
+    # rate-limit waits and spend quota on every symbol nobody has asked about lately
+    prices = price_source.cached_prices([stock.get('symbol') or '' for stock in stocks])
+    for stock in stocks:
+        ticker_price = prices.get((stock.get('symbol') or '').upper())
+        stock['ticker'] = ticker_price
+        stock['stock_value'] = round(ticker_price * stock.get('shares', 0), 2) if ticker_price is not None else None
+    return stocks
+
+
+def export_batches(cursor, batch_size, with_value):
+    batch = []
+    for stock in cursor:
+        stock['id'] = str(stock.pop('_id'))
+        batch.append(stock)
+        if len(batch) >= batch_size:
+            yield valued(batch) if with_value else batch
+            batch = []
+    if batch:
+        yield valued(batch) if with_value else batch
+
+
+def export_lines(cursor, fmt, batch_size, with_value):
+    """Yield the export one cursor batch at a time, so memory stays flat however many stocks there are."""
+    fields = EXPORT_FIELDS + VALUE_FIELDS if with_value else EXPORT_FIELDS
+    try:
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for batch in export_batches(cursor, batch_size, with_value):
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for batch in export_batches(cursor, batch_size, with_value):
+                yield ''.join(json.dumps({field: stock.get(field) for field in fields if field in stock}) + '\n'
+                              for stock in batch)
+    except Exception as e:
+        # Headers are already sent; re-raising aborts the response so a truncated export
+        # can't pass for a complete one
+        logger.error(f"Error while exporting stocks: {str(e)}")
+        raise
+
+
+@app.route('/stocks/export', methods=['GET'])
+def export_stocks():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        logger.warning(f"Unknown export format: {fmt}")
+        return jsonify({'error': "Unknown format. Expected 'ndjson' or 'csv'"}), 400
+    with_value = request.args.get('with_value', 'false').lower() == 'true'
+    try:
+        batch_size = positive_int_arg('batch_size', STREAM_BATCH_SIZE)
+    except ValueError as e:
+        logger.warning(f"Invalid query parameter: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+
+    logger.info(f"Exporting stocks as {fmt} (with_value: {with_value}) in batches of {batch_size}")
+    cursor = stocks_reads.find({}).batch_size(batch_size)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(export_lines(cursor, fmt, batch_size, with_value), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=stocks.{fmt}'})
+
+
 @app.route('/stocks/<stock_id>', methods=['GET'])
 def get_stock_by_id(stock_id):
     try:
         logger.info(f"Getting stock with ID: {stock_id}")
-        stock = stocks_collection.find_one({'_id': ObjectId(stock_id)})
+        stock = stocks_reads.find_one({'_id': ObjectId(stock_id)})
         if not stock:
             logger.warning(f"Stock with ID: {stock_id} not found")
             return jsonify({"error": "Stock not found"}), 404
@@ -179,6 +567,168 @@ def delete_stock(stock_id):
         return jsonify({'error': 'Invalid ID or server error', 'details': str(e)}), 400
 
 
+STOCK_FIELDS = {'name', 'symbol', 'purchase price', 'shares', 'price', 'purchase date'}
+
+
+def batch_selector(data):
+    """Turn ``{"ids": [...]}`` or ``{"filter": {...}}`` into a Mongo filter.
+
+    Filters are restricted to equality on stock fields so callers can't
+    smuggle in query operators. Raises ValueError on anything else.
+    """
+    if 'ids' in data:
+        if not isinstance(data['ids'], list) or not data['ids']:
+            raise ValueError("'ids' must be a non-empty list")
+        try:
+            return {'_id': {'$in': [ObjectId(stock_id) for stock_id in data['ids']]}}
+        except (InvalidId, TypeError) as e:
+            raise ValueError(f"Invalid ID: {str(e)}")
+    if 'filter' in data:
+        spec = data['filter']
+        if not isinstance(spec, dict) or not spec:
+            raise ValueError("'filter' must be a non-empty object")
+        for field, value in spec.items():
+            if field not in STOCK_FIELDS or isinstance(value, (dict, list)):
+                raise ValueError(f"Unsupported filter on '{field}'")
+        return dict(spec)
+    raise ValueError("Expected 'ids' or 'filter'")
+
+
+def stock_changes(fields):
+    changes = {field: value for field, value in fields.items() if field not in ('id', '_id')}
+    if not changes:
+        raise ValueError('No fields to update')
+    if 'symbol' in changes:
+        changes['symbol'] = str(changes['symbol']).upper()
+    return changes
+
+
+@app.route('/stocks/batch', methods=['PATCH'])
+def update_stocks_batch():
+    """Apply per-id changes (a JSON array of objects with "id") or one change to every match of a filter."""
+    data = request.get_json(silent=True)
+    try:
+        if isinstance(data, list) and data:
+            operations = [UpdateOne({'_id': ObjectId(item['id'])}, {'$set': stock_changes(item)}) for item in data]
+            logger.info(f"Bulk updating {len(operations)} stocks by ID")
+            result = stocks_collection.bulk_write(operations, ordered=False)
+        elif isinstance(data, dict) and isinstance(data.get('set'), dict):
+            selector = batch_selector(data)
+            logger.info(f"Bulk updating stocks matching {selector}")
+            result = stocks_collection.update_many(selector, {'$set': stock_changes(data['set'])},
+                                                   collation=SYMBOL_COLLATION)
+        else:
+            raise ValueError("Expected a JSON array of updates or an object with 'set' and 'ids' or 'filter'")
+    except (KeyError, TypeError, ValueError, InvalidId) as e:
+        logger.warning(f"Malformed batch update: {str(e)}")
+        return jsonify({'error': 'Malformed data', 'details': str(e)}), 400
+    except BulkWriteError as e:
+        logger.error(f"Batch update partially failed: {str(e)}")
+        return jsonify({'error': 'Some updates failed', 'details': e.details.get('writeErrors', [])}), 400
+    except DuplicateKeyError:
+        logger.error("Batch update would duplicate a symbol")
+        return jsonify({'error': 'Stock with this symbol already exists'}), 400
+    except Exception as e:
+        logger.error(f"Error in batch update: {str(e)}")
+        return jsonify({'error': 'An internal server error occurred', 'details': str(e)}), 500
+
+    logger.info(f"Batch update matched {result.matched_count}, modified {result.modified_count}")
+    return jsonify({'matched': result.matched_count, 'modified': result.modified_count}), 200
+
+
+@app.route('/stocks/batch', methods=['DELETE'])
+def delete_stocks_batch():
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Expected an object with 'ids' or 'filter'")
+        selector = batch_selector(data)
+    except ValueError as e:
+        logger.warning(f"Malformed batch delete: {str(e)}")
+        return jsonify({'error': 'Malformed data', 'details': str(e)}), 400
+
+    try:
+        logger.info(f"Bulk deleting stocks matching {selector}")
+        result = stocks_collection.delete_many(selector, collation=SYMBOL_COLLATION)
+        logger.info(f"Batch delete removed {result.deleted_count} stocks")
+        return jsonify({'deleted': result.deleted_count}), 200
+    except Exception as e:
+        logger.error(f"Error in batch delete: {str(e)}")
+        return jsonify({'error': 'An internal server error occurred', 'details': str(e)}), 500
+
+
+def price_error(e):
+    """Describe a failed price lookup the way fetch_stock_value reports it."""
+    if isinstance(e, (CircuitOpenError, RateLimitedError)):
+        return {'error': 'Price provider unavailable', 'details': str(e)}
+    if isinstance(e, PriceApiError):
+        return {'server error': str(e)} if e.status_code is not None else {'error': 'Unexpected API response format'}
+    return {'error': 'Failed to fetch current stock price', 'details': str(e)}
+
+
+@app.route('/stocks/stock-value', methods=['GET', 'POST'])
+def fetch_stock_values():
+    """Value many holdings at once: ?ids=a,b,c, or a POST body of {"ids": [...]} for long lists."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        stock_ids = data.get('ids') if isinstance(data, dict) else data
+    else:
+        stock_ids = [stock_id for stock_id in request.args.get('ids', '').split(',') if stock_id]
+    if not isinstance(stock_ids, list) or not stock_ids:
+        logger.warning("Stock value batch without ids")
+        return jsonify({'error': "Expected a non-empty list of ids"}), 400
+
+    try:
+        stock_ids = [str(stock_id) for stock_id in stock_ids]
+        object_ids = {}
+        for stock_id in stock_ids:
+            try:
+                object_ids[stock_id] = ObjectId(stock_id)
+            except InvalidId:
+                pass
+        logger.info(f"Fetching stock values for {len(stock_ids)} IDs")
+
+        # One query for every id, then one price lookup per distinct symbol
+        stocks = {stock['_id']: stock for stock in
+                  stocks_reads.find({'_id': {'$in': list(set(object_ids.values()))}}, {'symbol': 1, 'shares': 1})}
+        prices = price_source.get_prices([stock['symbol'] for stock in stocks.values() if stock.get('symbol')])
+
+        results = []
+        for stock_id in stock_ids:
+            if stock_id not in object_ids:
+                results.append({'id': stock_id, 'error': 'Invalid ID'})
+                continue
+            stock = stocks.get(object_ids[stock_id])
+            if stock is None:
+                results.append({'id': stock_id, 'error': 'Stock not found'})
+                continue
+            if not stock.get('symbol'):
+                logger.warning(f"Stock {stock_id} has no symbol")
+                results.append({'id': stock_id, 'error': 'Stock has no symbol'})
+                continue
+            symbol = stock['symbol'].upper()
+            ticker_price = prices[symbol]
+            if isinstance(ticker_price, Exception):
+                logger.error(f"Failed to price {symbol}: {str(ticker_price)}")
+                results.append(dict(price_error(ticker_price), id=stock_id, symbol=symbol))
+                continue
+            if ticker_price is None:
+                ticker_price = 0.0
+            results.append({
+                'id': stock_id,
+                'symbol': symbol,
+                'ticker': round(ticker_price, 2),
+                'stock_value': round(ticker_price * stock.get('shares', 0), 2),
+            })
+
+        failed = sum(1 for result in results if 'stock_value' not in result)
+        logger.info(f"Valued {len(results) - failed} stocks, {failed} failed")
+        return jsonify({'results': results}), 200
+    except Exception as e:
+        logger.error(f"Error fetching stock values: {str(e)}")
+        return jsonify({'error': 'An internal server error occurred', 'details': str(e)}), 500
+
+
 @app.route('/stocks/stock-value/<stock_id>', methods=['GET'])
 def fetch_stock_value(stock_id):
     try:
@@ -192,22 +742,11 @@ def fetch_stock_value(stock_id):
         shares = stock.get('shares', 0)
         logger.info(f"Fetching current price for symbol: {symbol}")
 
-        # Fetch the current ticker price from the external API
+        # Fetch the current ticker price (served from the price cache when fresh)
         try:
-
-            response = requests.get(f"{BASE_URL}?ticker={symbol}", headers={"X-Api-Key": API_KEY})
-            if response.status_code != 200:
-                logger.error(f"API error for symbol {symbol}: {response.status_code}")
-                return jsonify({'server error': f'API response code {response.status_code}'}), 500
-
-            api_response = response.json()
-            if isinstance(api_response, list):
-                ticker_price = api_response[0].get('price', 0.0) if len(api_response) > 0 else 0.0
-            elif isinstance(api_response, dict):
-                ticker_price = api_response.get('price', 0.0)
-            else:
-                logger.error(f"Unexpected API response format for symbol {symbol}: {api_response}")
-                return jsonify({'error': 'Unexpected API response format'}), 500
+            ticker_price = get_ticker_price(symbol)
+            if ticker_price is None:
+                ticker_price = 0.0
 
             stock_value = ticker_price * shares
             logger.info(f"Calculated stock value for {symbol}: ${stock_value}")
@@ -217,6 +756,14 @@ def fetch_stock_value(stock_id):
                 'ticker': round(ticker_price, 2),
                 'stock_value': round(stock_value, 2),
             }), 200
+        except (CircuitOpenError, RateLimitedError) as e:
+            logger.error(f"Price provider unavailable for {symbol}: {str(e)}")
+            return jsonify({'error': 'Price provider unavailable', 'details': str(e)}), 503
+        except PriceApiError as e:
+            logger.error(f"API error for symbol {symbol}: {str(e)}")
+            if e.status_code is not None:
+                return jsonify({'server error': str(e)}), 500
+            return jsonify({'error': 'Unexpected API response format'}), 500
         except requests.RequestException as e:
             logger.error(f"Request exception when fetching ticker for {symbol}: {str(e)}")
             return jsonify({'error': 'Failed to fetch current stock price', 'details': str(e)}), 500
@@ -230,32 +777,41 @@ def get_portfolio_value():
     try:
         logger.info("Calculating portfolio value")
         total_value = 0.0
-        stocks = list(stocks_collection.find({}, {'_id': 0}))
-        logger.info(f"Found {len(stocks)} stocks in portfolio")
+
+        engine = request.args.get('engine', PORTFOLIO_VALUE_ENGINE)
+        if engine == 'snapshot':
+            total_value = current_portfolio_value()['portfolio_value']
+            logger.info(f"Total portfolio value from snapshot version {portfolio_snapshot.version}: ${total_value}")
+            return jsonify({'portfolio_value': total_value}), 200
+        if engine != 'python':
+            logger.warning(f"Unknown portfolio value engine: {engine}")
+            return jsonify({'error': "Unknown engine. Expected 'python' or 'snapshot'"}), 400
+
+        # Shares per symbol from the change-stream aggregate when it's live, else scan every holding
+        aggregate = read_positions(aggregates_collection) if USE_PORTFOLIO_AGGREGATES else None
+        if aggregate is not None:
+            positions, _ = aggregate
+            stocks = [{'symbol': symbol, 'shares': position['shares']} for symbol, position in positions.items()]
+            logger.info(f"Read {len(stocks)} positions from the portfolio aggregate")
+        else:
+            stocks = list(stocks_collection.find({}, {'_id': 0, 'symbol': 1, 'shares': 1}))
+            logger.info(f"Found {len(stocks)} stocks in portfolio")
+
+        # Price every distinct symbol concurrently, then aggregate
+        prices = price_source.get_prices([stock['symbol'] for stock in stocks])
 
         for stock in stocks:
-            symbol = stock['symbol']
+            symbol = stock['symbol'].upper()
             shares = stock['shares']
 
-            # Fetch current price
-            try:
-                response = requests.get(f"{BASE_URL}?ticker={symbol}", headers={"X-Api-Key": API_KEY})
-                if response.status_code == 200:
-                    api_response = response.json()
-                    if isinstance(api_response, list):
-                        ticker_price = api_response[0].get('price', 0.0) if len(api_response) > 0 else 0.0
-                    elif isinstance(api_response, dict):
-                        ticker_price = api_response.get('price', 0.0)
-                    else:
-                        logger.error(f"Unexpected API response format for {symbol}: {api_response}")
-                        continue
-
-                    total_value += ticker_price * shares
-                    logger.info(f"Current value for {symbol}: ${ticker_price*shares}")
-                else:
-                    logger.error(f"API error for {symbol}: {response.status_code}")
-            except requests.RequestException as e:
-                logger.error(f"Request exception for {symbol}: {str(e)}")
+            ticker_price = prices[symbol]
+            if isinstance(ticker_price, Exception):
+                logger.error(f"Failed to fetch price for {symbol}: {str(ticker_price)}")
+                continue
+            if ticker_price is None:
+                ticker_price = 0.0
+            total_value += ticker_price * shares
+            logger.info(f"Current value for {symbol}: ${ticker_price*shares}")
 
         logger.info(f"Total portfolio value: ${total_value}")
         return jsonify({
@@ -267,6 +823,89 @@ def get_portfolio_value():
         return jsonify({'error': 'An internal server error occurred', 'details': str(e)}), 500
 
 
+@app.route('/stocks/portfolio-value/stream', methods=['GET'])
+def stream_portfolio_value():
+    logger.info("Portfolio value stream subscriber connected")
+    return Response(portfolio_stream.stream(PORTFOLIO_STREAM_HEARTBEAT), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', '5000'))
+
+
+def parse_time(value, default):
+    """Epoch seconds or an ISO 8601 timestamp (UTC unless it says otherwise)."""
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def history_point(t, value, unpriced):
+    point = {'t': datetime.fromtimestamp(t, timezone.utc).isoformat()}
+    if unpriced:
+        # A partial sum would understate the portfolio
+        return dict(point, portfolio_value=None, unpriced_symbols=unpriced)
+    return dict(point, portfolio_value=round(float(value), 2))
+
+
+@app.route('/stocks/portfolio-value/history', methods=['GET'])
+def get_portfolio_value_history():
+    """Value the current holdings at every step between from and to, using only recorded quotes.
+
+    A point is null, with the symbols it lacks listed, unless every held symbol has a quote by then.
+    """
+    try:
+        end = parse_time(request.args.get('to'), time.time())
+        start = parse_time(request.args.get('from'), end - DAY)
+        step_arg = request.args.get('step', 'hour')
+        step = STEPS[step_arg] if step_arg in STEPS else float(step_arg)
+    except ValueError as e:
+        logger.warning(f"Malformed history query: {str(e)}")
+        return jsonify({'error': 'Malformed query. from/to are epoch seconds or ISO 8601, '
+                                 "step is minute, hour, day or seconds"}), 400
+    if not np.isfinite([start, end, step]).all() or step <= 0 or end < start:
+        return jsonify({'error': 'Expected from <= to and a positive step'}), 400
+    if (end - start) / step >= HISTORY_MAX_POINTS:
+        return jsonify({'error': f'Too many points, at most {HISTORY_MAX_POINTS} per request'}), 400
+
+    try:
+        holdings = portfolio_snapshot.holdings()
+        held = np.unique(holdings.symbol_index)
+        symbols = [holdings.symbols[i] for i in held]
+        shares = np.bincount(holdings.symbol_index, weights=holdings.shares, minlength=len(holdings.symbols))[held]
+
+        times = np.arange(start, end + step / 2, step)
+        # arange can overshoot by one step when (to - from) isn't a multiple of it
+        times = times[times <= end]
+        prices = price_client.history.matrix(symbols, times)
+        values = (prices * shares[:, None]).sum(axis=0)
+        unpriced = np.isnan(prices)
+
+        missing = [symbol for symbol, row in zip(symbols, prices) if np.isnan(row).all()]
+        logger.info(f"Valued {len(symbols)} symbols at {len(times)} points from price history")
+        return jsonify({
+            'from': start,
+            'to': end,
+            'step': step,
+            'points': [history_point(t, value, [symbol for symbol, lacks in zip(symbols, column) if lacks])
+                       for t, value, column in zip(times, values, unpriced.T)],
+            'symbols_without_history': missing,
+        }), 200
+    except Exception as e:
+        logger.error(f"Error calculating portfolio value history: {str(e)}")
+        return jsonify({'error': 'An internal server error occurred', 'details': str(e)}), 500
+
+
+app.register_blueprint(health_blueprint(
+    mongo, lambda: dict(price_source.stats(), portfolio_stream=portfolio_stream.stats())))
+
+
 @app.route('/kill', methods=['GET'])
 def kill_container():
     logger.warning("Kill endpoint accessed - shutting down service")
@@ -0,0 +1,15 @@
+import os
+
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+# More than one thread selects the gthread worker; each open /stocks/portfolio-value/stream holds a thread
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Import the app once in the master; safe because nothing in it connects to MongoDB at import time
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Make sure no MongoClient state crosses the fork; the worker connects on first use
+    from app import mongo
+    mongo.reset()
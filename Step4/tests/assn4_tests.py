@@ -49,9 +49,9 @@ def test_1_post_stocks():
     try:
         resp = requests.get(f"{STOCKS_URL}/stocks")
         if resp.status_code == 200:
-            for stock in resp.json():
-                if '_id' in stock:
-                    requests.delete(f"{STOCKS_URL}/stocks/{stock['_id']}")
+            ids = [stock['_id'] for stock in resp.json() if '_id' in stock]
+            if ids:
+                requests.delete(f"{STOCKS_URL}/stocks/batch", json={"ids": ids})
     except:
         pass
 
@@ -193,4 +193,146 @@ def test_9_invalid_date_format():
         json=stock8,
         headers={"Content-Type": "application/json"}
     )
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+def test_10_duplicate_symbol_any_case():
+    """Test 10: Check that a symbol differing only in case is rejected as a duplicate"""
+    # Skip if test_1 failed
+    if 'stock1' not in stock_ids:
+        pytest.skip("stock1 ID not available")
+
+    duplicate = dict(stock1, symbol="nvda")
+    response = requests.post(
+        f"{STOCKS_URL}/stocks",
+        json=duplicate,
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
+
+
+def test_11_batch_insert():
+    """Test 11: Insert several stocks in one call and check per-item results"""
+    batch = [
+        {"name": "Microsoft Corporation", "symbol": "MSFT", "purchase price": 410.5, "purchase date": "02-01-2024",
+         "shares": 3},
+        stock8,
+    ]
+    response = requests.post(f"{STOCKS_URL}/stocks/batch", json=batch)
+    assert response.status_code == 207
+    body = response.json()
+    assert body["inserted"] == 1 and body["failed"] == 1
+    assert "id" in body["results"][0]
+    assert "error" in body["results"][1]
+
+    requests.delete(f"{STOCKS_URL}/stocks/{body['results'][0]['id']}")
+
+
+def test_12_import_csv_with_bad_row():
+    """Test 12: Import a CSV where one row is malformed and check the others are still inserted"""
+    body = ("symbol,name,purchase price,shares,purchase date,price\n"
+            "INTC,Intel Corporation,30.5,10,02-01-2024,31\n"
+            "CSCO,Cisco Systems,50,5,02-01-2024,abc\n"
+            "ORCL,Oracle Corporation,120,4,02-01-2024,125\n")
+    response = requests.post(f"{STOCKS_URL}/stocks/import", data=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 207
+    report = response.json()
+    assert report["inserted"] == 2 and report["failed"] == 1
+    assert report["errors"][0]["row"] == 3
+
+    requests.delete(f"{STOCKS_URL}/stocks/batch", json={"filter": {"symbol": "INTC"}})
+    requests.delete(f"{STOCKS_URL}/stocks/batch", json={"filter": {"symbol": "ORCL"}})
+
+
+def test_13_batch_stock_values():
+    """Test 13: Value several stocks in one call and check per-id results come back in request order"""
+    for stock_key in ['stock1', 'stock2', 'stock3']:
+        if stock_key not in stock_ids:
+            pytest.skip(f"{stock_key} ID not available")
+
+    # stock2 was deleted in test 7
+    ids = [stock_ids['stock3'], "not-an-id", stock_ids['stock1'], stock_ids['stock2']]
+    response = requests.get(f"{STOCKS_URL}/stocks/stock-value", params={"ids": ",".join(ids)})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["id"] for result in results] == ids
+    assert results[0]["symbol"] == "GOOG" and "stock_value" in results[0]
+    assert results[1]["error"] == "Invalid ID"
+    assert results[2]["symbol"] == "NVDA" and "stock_value" in results[2]
+    assert results[3]["error"] == "Stock not found"
+
+    # Long id lists go in a POST body and get the same answer
+    response = requests.post(f"{STOCKS_URL}/stocks/stock-value", json={"ids": ids})
+    assert response.status_code == 200
+    assert [result["id"] for result in response.json()["results"]] == ids
+
+
+def test_14_batch_update():
+    """Test 14: Update stocks by id and by filter in one call each"""
+    for stock_key in ['stock1', 'stock3']:
+        if stock_key not in stock_ids:
+            pytest.skip(f"{stock_key} ID not available")
+
+    response = requests.patch(f"{STOCKS_URL}/stocks/batch",
+                              json=[{"id": stock_ids['stock1'], "name": "NVIDIA Corp."}])
+    assert response.status_code == 200
+    assert response.json()["matched"] == 1
+    assert requests.get(f"{STOCKS_URL}/stocks/{stock_ids['stock1']}").json()["name"] == "NVIDIA Corp."
+
+    response = requests.patch(f"{STOCKS_URL}/stocks/batch",
+                              json={"filter": {"symbol": "GOOG"}, "set": {"name": "Alphabet"}})
+    assert response.status_code == 200
+    assert response.json()["matched"] == 1
+    assert requests.get(f"{STOCKS_URL}/stocks/{stock_ids['stock3']}").json()["name"] == "Alphabet"
+
+    # Query operators aren't allowed in filters
+    response = requests.patch(f"{STOCKS_URL}/stocks/batch",
+                              json={"filter": {"shares": {"$gt": 0}}, "set": {"shares": 0}})
+    assert response.status_code == 400
+
+    requests.patch(f"{STOCKS_URL}/stocks/batch", json=[{"id": stock_ids['stock1'], "name": stock1["name"]},
+                                                       {"id": stock_ids['stock3'], "name": stock3["name"]}])
+
+
+def test_15_paginate_and_stream_stocks():
+    """Test 15: Page through stocks one at a time and check the pages and the stream cover the full list"""
+    all_ids = sorted(stock["_id"] for stock in requests.get(f"{STOCKS_URL}/stocks").json())
+
+    paged_ids = []
+    params = {"limit": 1}
+    while True:
+        response = requests.get(f"{STOCKS_URL}/stocks", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 1
+        paged_ids += [stock["_id"] for stock in page]
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params = {"limit": 1, "after": response.headers["X-Next-Cursor"]}
+    assert paged_ids == all_ids
+
+    response = requests.get(f"{STOCKS_URL}/stocks", params={"stream": "true", "batch_size": 1})
+    assert response.status_code == 200
+    assert sorted(stock["_id"] for stock in response.json()) == all_ids
+
+    assert requests.get(f"{STOCKS_URL}/stocks", params={"limit": 0}).status_code == 400
+    assert requests.get(f"{STOCKS_URL}/stocks", params={"after": "not-an-id"}).status_code == 400
+
+
+def test_16_export_stocks():
+    """Test 16: Export every stock as NDJSON and CSV"""
+    all_ids = sorted(stock["_id"] for stock in requests.get(f"{STOCKS_URL}/stocks").json())
+
+    response = requests.get(f"{STOCKS_URL}/stocks/export", params={"batch_size": 1, "with_value": "true"})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["id"] for row in rows) == all_ids
+    # Only already cached prices are joined, so the value may be empty
+    assert all("ticker" in row and "stock_value" in row for row in rows)
+
+    response = requests.get(f"{STOCKS_URL}/stocks/export", params={"format": "csv"})
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,name,symbol,purchase price,shares,price,purchase date"
+    assert len(lines) == len(all_ids) + 1
+
+    assert requests.get(f"{STOCKS_URL}/stocks/export", params={"format": "xml"}).status_code == 400